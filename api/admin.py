@@ -0,0 +1,31 @@
+import hmac
+import os
+from flask import Blueprint, jsonify, request
+from shared_graph import holder
+
+admin_blueprint = Blueprint("admin", __name__)
+
+# Admin requests need an "Authorization: Bearer <token>" header; without a
+# token the admin endpoints are disabled
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+@admin_blueprint.before_request
+def check_token():
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "The admin endpoints are disabled, set ADMIN_TOKEN to enable them"}), 403
+    if not hmac.compare_digest(request.headers.get("Authorization", "").encode("utf-8"),
+                               f"Bearer {ADMIN_TOKEN}".encode("utf-8")):
+        return jsonify({"error": "Unauthorized"}), 401
+
+@admin_blueprint.route('/admin/graph', methods=['GET'])
+def graph_status():
+    """Return the version of the served graph and the state of its reloads"""
+    return jsonify(holder.status())
+
+@admin_blueprint.route('/admin/reload', methods=['POST'])
+def reload_graph():
+    """Load the graph again in the background if the pipeline wrote a new version"""
+    started = holder.reload_in_background(force=request.args.get("force") == "1")
+    status = holder.status()
+    status["started"] = started
+    return jsonify(status), 202
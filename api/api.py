@@ -1,138 +1,159 @@
-import os
-from flask import Flask, jsonify, request
-from rdflib import Graph
+from flask import Blueprint, Flask, jsonify, request
 import json
+import os
+from werkzeug.exceptions import BadRequest
+from shared_graph import holder, served_state
+from admin import admin_blueprint
+from http_cache import conditional
+from paper_index import PaperIndex, PAPER_FIELDS, TOPIC_FIELDS
+from search.inverted_index import SearchIndex, SEARCH_INDEX_DIR
+from similarity.neighbors import PaperNeighbors, NEIGHBORS_DIR
+
+api_blueprint = Blueprint("api", __name__)
+
+# Papers and topics are served from indexes built with each loaded graph
+holder.derive("paper_index", PaperIndex)
+
+def load_search_index(graph):
+    """Full-text index written by the pipeline's search stage, or None if it has not run"""
+    path = os.path.join(holder.output_folder, SEARCH_INDEX_DIR)
+    return SearchIndex(path) if os.path.isdir(path) else None
+
+holder.derive("search_index", load_search_index)
+
+def load_neighbors(graph):
+    """Neighbour lists written by the pipeline's similarity stage, or None if it has not run"""
+    path = os.path.join(holder.output_folder, NEIGHBORS_DIR)
+    return PaperNeighbors(path) if os.path.isdir(path) else None
+
+holder.derive("paper_neighbors", load_neighbors)
+
+# Page size of the paginated endpoints, and the largest one a client can ask for
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Deepest search result a client can page to
+MAX_SEARCH_OFFSET = 10000
+
+@api_blueprint.errorhandler(BadRequest)
+def bad_request(error):
+    return jsonify({"error": error.description}), 400
 
-app = Flask(__name__)
+def paper_index():
+    """Index of the graph served when the request started"""
+    return served_state().derived["paper_index"]
 
-# Load RDF data
-graph = Graph()
-rdf_path = os.path.join("/app", "output", "papers_wikidata_enriched.ttl")
-graph.parse(rdf_path, format="turtle")
+def int_arg(name, default, low, high):
+    """Return the integer parameter ``name``, checked to be between ``low`` and ``high``"""
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer")
+    if not low <= value <= high:
+        raise BadRequest(f"{name} must be between {low} and {high}")
+    return value
 
-@app.route('/api/papers', methods=['GET'])
+def page_args():
+    """Return the ``after`` cursor and the ``limit`` of a paginated request"""
+    return request.args.get("after"), int_arg("limit", PAGE_SIZE, 1, MAX_PAGE_SIZE)
+
+def field_args(allowed, default):
+    """Return the fields listed in the ``fields`` parameter, checked against ``allowed``"""
+    if "fields" not in request.args:
+        return default
+    fields = [field for field in request.args["fields"].split(",") if field]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown or not fields:
+        raise BadRequest(f"fields must be a comma-separated list of: {', '.join(allowed)}")
+    return fields
+
+def scored_papers(hits, fields):
+    """Return the ``fields`` of the papers of (paper id, score) pairs, with their score"""
+    index = paper_index()
+    papers = []
+    for paper_id, score in hits:
+        # The search and similarity indexes can list papers the graph lacks, e.g. without a title
+        paper = index.paper(paper_id, fields) or {"id": paper_id}
+        if "year" in paper and paper["year"] is None:
+            paper["year"] = "Unknown"
+        paper["score"] = round(score, 4)
+        papers.append(paper)
+    return papers
+
+@api_blueprint.route('/api/papers', methods=['GET'])
+@conditional
 def get_papers():
-    """Return list of all papers"""
-    query = """
-    PREFIX dcterms: <http://purl.org/dc/terms/>
-    PREFIX ex: <http://example.org/resource/>
-    
-    SELECT ?paper ?title ?year 
-    WHERE {
-        ?paper dcterms:title ?title .
-        OPTIONAL { ?paper dcterms:issued ?year }
-    }
-    """
-    
-    results = graph.query(query)
-    papers = [
-        {
-            "id": str(row.paper).split('/')[-1],
-            "title": str(row.title),
-            "year": str(row.year) if row.year else "Unknown"
-        }
-        for row in results
-    ]
-    
-    return jsonify({"papers": papers})
-
-@app.route('/api/papers/<paper_id>', methods=['GET'])
+    """Return a page of papers, sorted by id; ``after`` is the ``next`` cursor of the previous page"""
+    after, limit = page_args()
+    fields = field_args(PAPER_FIELDS, ("id", "title", "year"))
+    index = paper_index()
+    ids, next_cursor = index.paper_page(after, limit)
+    papers = []
+    for paper_id in ids:
+        paper = index.paper(paper_id, fields)
+        if "year" in paper and paper["year"] is None:
+            paper["year"] = "Unknown"
+        papers.append(paper)
+    return jsonify({"papers": papers, "next": next_cursor})
+
+@api_blueprint.route('/api/papers/<paper_id>', methods=['GET'])
+@conditional
 def get_paper(paper_id):
     """Return details for a specific paper"""
-    paper_uri = f"http://example.org/resource/{paper_id}"
-    
-    query = f"""
-    PREFIX dcterms: <http://purl.org/dc/terms/>
-    PREFIX foaf: <http://xmlns.com/foaf/0.1/>
-    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-    
-    SELECT ?title ?year ?publisher ?topic ?topicLabel ?creator ?creatorName
-    WHERE {{
-        <{paper_uri}> dcterms:title ?title .
-        OPTIONAL {{ <{paper_uri}> dcterms:issued ?year }}
-        OPTIONAL {{ <{paper_uri}> dcterms:publisher ?publisher }}
-        OPTIONAL {{ 
-            <{paper_uri}> dcterms:subject ?topic .
-            ?topic skos:prefLabel ?topicLabel 
-        }}
-        OPTIONAL {{ 
-            <{paper_uri}> dcterms:creator ?creator .
-            ?creator foaf:name ?creatorName 
-        }}
-    }}
-    """
-    
-    results = graph.query(query)
-    
-    if not results:
+    paper = paper_index().paper(paper_id, field_args(PAPER_FIELDS, PAPER_FIELDS))
+    if paper is None:
         return jsonify({"error": "Paper not found"}), 404
-    
-    paper = {
-        "id": paper_id,
-        "title": None,
-        "year": None,
-        "publisher": None,
-        "topics": [],
-        "authors": []
-    }
-    
-    topics_set = set()
-    authors_set = set()
-    
-    for row in results:
-        paper["title"] = str(row.title)
-        if row.year:
-            paper["year"] = str(row.year)
-        if row.publisher:
-            paper["publisher"] = str(row.publisher)
-        if row.topic and row.topicLabel:
-            topic_info = {
-                "uri": str(row.topic),
-                "label": str(row.topicLabel)
-            }
-            topic_key = topic_info["uri"]
-            if topic_key not in topics_set:
-                topics_set.add(topic_key)
-                paper["topics"].append(topic_info)
-        if row.creator and row.creatorName:
-            author_info = {
-                "uri": str(row.creator),
-                "name": str(row.creatorName)
-            }
-            author_key = author_info["uri"]
-            if author_key not in authors_set:
-                authors_set.add(author_key)
-                paper["authors"].append(author_info)
-    
     return jsonify(paper)
 
-@app.route('/api/topics', methods=['GET'])
+@api_blueprint.route('/api/papers/<paper_id>/similar', methods=['GET'])
+@conditional
+def get_similar_papers(paper_id):
+    """Return the ``k`` papers whose abstracts are most similar to the abstract of a paper"""
+    index = paper_index()
+    if index.paper(paper_id, ("id",)) is None:
+        return jsonify({"error": "Paper not found"}), 404
+    neighbors = served_state().derived["paper_neighbors"]
+    if neighbors is None:
+        return jsonify({"error": "The similar papers have not been computed, run the pipeline's similarity stage"}), 503
+    # Lists of small corpora are shorter than the k a client asks for
+    k = min(int_arg("k", 10, 1, MAX_PAGE_SIZE), neighbors.k)
+    fields = field_args(PAPER_FIELDS, ("id", "title", "year"))
+
+    # Papers without an abstract have no neighbours
+    return jsonify({"id": paper_id, "papers": scored_papers(neighbors.similar(paper_id, k) or [], fields)})
+
+@api_blueprint.route('/api/topics', methods=['GET'])
+@conditional
 def get_topics():
-    """Return all topics with their papers"""
-    query = """
-    PREFIX dcterms: <http://purl.org/dc/terms/>
-    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-    
-    SELECT ?topic ?label (COUNT(?paper) AS ?paperCount)
-    WHERE {
-        ?paper dcterms:subject ?topic .
-        ?topic skos:prefLabel ?label .
-    }
-    GROUP BY ?topic ?label
-    ORDER BY DESC(?paperCount)
-    """
-    
-    results = graph.query(query)
-    topics = [
-        {
-            "uri": str(row.topic),
-            "label": str(row.label),
-            "paperCount": int(row.paperCount)
-        }
-        for row in results
-    ]
-    
-    return jsonify({"topics": topics})
+    """Return a page of topics with their number of papers, most frequent first"""
+    after, limit = page_args()
+    fields = field_args(TOPIC_FIELDS, TOPIC_FIELDS)
+    try:
+        topics, next_cursor = paper_index().topic_page(after, limit, fields)
+    except KeyError:
+        raise BadRequest("after must be the next cursor of a previous page")
+    return jsonify({"topics": topics, "next": next_cursor})
+
+@api_blueprint.route('/api/search', methods=['GET'])
+@conditional
+def search_papers():
+    """Return a page of the papers whose title or abstract match ``q``, best match first"""
+    query = request.args.get("q", "").strip()
+    if not query:
+        raise BadRequest("q must be a non-empty search query")
+    limit = int_arg("limit", PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    offset = int_arg("offset", 0, 0, MAX_SEARCH_OFFSET)
+    fields = field_args(PAPER_FIELDS, ("id", "title", "year"))
+    search_index = served_state().derived["search_index"]
+    if search_index is None:
+        return jsonify({"error": "The search index has not been built, run the pipeline's search stage"}), 503
+
+    total, hits = search_index.search(query, limit, offset)
+    next_offset = offset + limit if offset + limit < total else None
+    return jsonify({"papers": scored_papers(hits, fields), "total": total, "next": next_offset})
 
 if __name__ == '__main__':
+    app = Flask(__name__)
+    app.register_blueprint(api_blueprint)
+    app.register_blueprint(admin_blueprint)
+    holder.watch()
     app.run(debug=True, port=5001, host='0.0.0.0')
\ No newline at end of file
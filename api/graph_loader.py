@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import sys
+from rdflib import Graph
+
+# The triple store implementation lives with the pipeline code
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from triplestore.sqlite_store import SQLiteStore, SQLITE_STORE_FILE
+from triplestore.array_store import ArrayStore, SNAPSHOT_DIR
+
+# Files written by the pipeline in its output folder
+BASE_GRAPH = "papers_with_topics.nt"
+SAMEAS_DELTA = "papers_wikidata_sameas.nt"
+PUBLISHED_GRAPH = "papers_wikidata_enriched.ttl"
+
+NAMESPACES = {
+    "dcterms": "http://purl.org/dc/terms/",
+    "foaf": "http://xmlns.com/foaf/0.1/",
+    "bibo": "http://purl.org/ontology/bibo/",
+    "skos": "http://www.w3.org/2004/02/skos/core#",
+    "owl": "http://www.w3.org/2002/07/owl#",
+    "ex": "http://example.org/resource/",
+    "wd": "http://www.wikidata.org/entity/",
+}
+
+def load_graph(output_folder, graph_class=Graph):
+    """
+    Load the knowledge graph produced by the pipeline.
+
+    The memory-mapped snapshot of the graph is preferred, then the SQLite
+    triple store; both are opened read-only without loading the graph in
+    memory, and processes share their pages. Without either, the base
+    N-Triples graph is parsed together with the Wikidata owl:sameAs delta,
+    and output folders from older runs, which only have the published
+    Turtle file, are still supported. The graph is a ``graph_class``.
+    """
+    snapshot_path = os.path.join(output_folder, SNAPSHOT_DIR)
+    if os.path.isdir(snapshot_path):
+        return graph_class(store=ArrayStore(snapshot_path))
+
+    store_path = os.path.join(output_folder, SQLITE_STORE_FILE)
+    if os.path.exists(store_path):
+        return graph_class(store=SQLiteStore(store_path))
+
+    graph = graph_class()
+    for prefix, namespace in NAMESPACES.items():
+        graph.bind(prefix, namespace)
+
+    base_path = os.path.join(output_folder, BASE_GRAPH)
+    if os.path.exists(base_path):
+        graph.parse(base_path, format="nt")
+        delta_path = os.path.join(output_folder, SAMEAS_DELTA)
+        if os.path.exists(delta_path):
+            graph.parse(delta_path, format="nt")
+    else:
+        graph.parse(os.path.join(output_folder, PUBLISHED_GRAPH), format="turtle")
+    return graph
+
+def graph_version(output_folder):
+    """
+    Identifier of the graph load_graph() loads from ``output_folder``.
+
+    The stores record the version of the base graph and of the Wikidata
+    links they were built from, and the version names the store it was read
+    from, so a graph served from the SQLite store while the snapshot was
+    being replaced is reloaded from the new snapshot; for plain RDF files,
+    or stores written without a version, the size and modification time of
+    the files are used.
+    """
+    snapshot_meta = os.path.join(output_folder, SNAPSHOT_DIR, "meta.json")
+    store_path = os.path.join(output_folder, SQLITE_STORE_FILE)
+    meta = {}
+    if os.path.exists(snapshot_meta):
+        with open(snapshot_meta, "r", encoding="utf-8") as f:
+            meta = dict(json.load(f)["meta"], store=SNAPSHOT_DIR)
+    elif os.path.exists(store_path):
+        store = SQLiteStore(store_path)
+        meta = {key: store.get_meta(key) for key in ("version", "sameas", "triples")}
+        meta["store"] = SQLITE_STORE_FILE
+        store.close()
+
+    if not meta.get("version"):
+        meta = {}
+        for name in (os.path.join(SNAPSHOT_DIR, "meta.json"), SQLITE_STORE_FILE,
+                     BASE_GRAPH, SAMEAS_DELTA, PUBLISHED_GRAPH):
+            path = os.path.join(output_folder, name)
+            if os.path.exists(path):
+                stat = os.stat(path)
+                meta[name] = [stat.st_size, stat.st_mtime_ns]
+    payload = json.dumps(meta, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,22 @@
+# Production server settings of wsgi:app, overridable with environment variables
+import multiprocessing
+import os
+
+# The REST API and the SPARQL endpoint keep their development ports
+bind = [f"0.0.0.0:{port}" for port in os.environ.get("API_PORTS", "5000,5001").split(",")]
+
+workers = int(os.environ.get("API_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("API_THREADS", 4))
+worker_class = "gthread"
+
+# Load the app, and with it the graph, once in the master process; the
+# forked workers share its memory pages copy-on-write
+preload_app = True
+
+accesslog = "-"
+
+def post_fork(server, worker):
+    # Threads do not survive the fork: each worker watches the output folder
+    # and reloads the graph when the pipeline writes a new version
+    from shared_graph import holder
+    holder.watch()
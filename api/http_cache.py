@@ -0,0 +1,48 @@
+import hashlib
+import json
+import os
+from functools import wraps
+from flask import Response, make_response, request
+from shared_graph import served_state
+
+# Seconds an HTTP cache may reuse a response without revalidating it
+HTTP_CACHE_MAX_AGE = int(os.environ.get("HTTP_CACHE_MAX_AGE", 60))
+
+def make_etag(version, *parts):
+    """ETag of a response of graph ``version`` to the request identified by ``parts``."""
+    payload = json.dumps([version, *parts], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+def set_cache_headers(response, etag, vary=None):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"public, max-age={HTTP_CACHE_MAX_AGE}"
+    if vary:
+        response.vary.add(vary)
+    return response
+
+def not_modified(etag, vary=None):
+    """
+    304 response if the client already has the response tagged ``etag``,
+    otherwise None.
+    """
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return set_cache_headers(Response(status=304), etag, vary)
+
+def conditional(view):
+    """
+    Tag the successful responses of a GET ``view`` with an ETag of the graph
+    version, the path and the query parameters, and answer requests that
+    already have it with 304 without calling the view.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = make_etag(served_state().version, request.path, sorted(request.args.items(multi=True)))
+        response = not_modified(etag)
+        if response is not None:
+            return response
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            set_cache_headers(response, etag)
+        return response
+    return wrapper
@@ -0,0 +1,90 @@
+from bisect import bisect_right
+from collections import Counter
+from rdflib.namespace import DCTERMS, FOAF, SKOS
+
+# Fields a paper or topic response can be projected to
+PAPER_FIELDS = ("id", "title", "year", "publisher", "topics", "authors")
+TOPIC_FIELDS = ("uri", "label", "paperCount")
+
+def _local_name(uri):
+    return str(uri).split("/")[-1]
+
+class PaperIndex:
+    """
+    Lookups of the REST API, precomputed from the graph when it is loaded.
+
+    Each paper (a subject with a dcterms:title) keeps its title, year,
+    publisher, topics and authors; paper ids are sorted for keyset
+    pagination, and topics are sorted by their number of papers. Building
+    the index scans one predicate at a time, and responses only build the
+    records of the page they return.
+    """
+
+    def __init__(self, graph):
+        # id -> [title, year, publisher, topic uris, author uris]
+        self.papers = {}
+        by_uri = {}
+        for paper, title in graph.subject_objects(DCTERMS.title):
+            record = self.papers.setdefault(_local_name(paper), [str(title), None, None, [], []])
+            by_uri[paper] = record
+
+        for column, predicate in ((1, DCTERMS.issued), (2, DCTERMS.publisher)):
+            for paper, value in graph.subject_objects(predicate):
+                if paper in by_uri:
+                    by_uri[paper][column] = str(value)
+
+        paper_counts = Counter()
+        for paper, topic in graph.subject_objects(DCTERMS.subject):
+            paper_counts[topic] += 1
+            if paper in by_uri:
+                by_uri[paper][3].append(str(topic))
+        for paper, creator in graph.subject_objects(DCTERMS.creator):
+            if paper in by_uri:
+                by_uri[paper][4].append(str(creator))
+
+        self.topic_labels = {str(topic): str(label) for topic, label in graph.subject_objects(SKOS.prefLabel)}
+        self.author_names = {str(author): str(name) for author, name in graph.subject_objects(FOAF.name)}
+
+        self.paper_ids = sorted(self.papers)
+        self.topics = sorted(
+            ((str(topic), self.topic_labels[str(topic)], count)
+             for topic, count in paper_counts.items() if str(topic) in self.topic_labels),
+            key=lambda topic: (-topic[2], topic[0])
+        )
+        self.topic_positions = {topic[0]: i for i, topic in enumerate(self.topics)}
+
+    def paper(self, paper_id, fields=PAPER_FIELDS):
+        """Return the ``fields`` of a paper, or None if there is no such paper."""
+        record = self.papers.get(paper_id)
+        if record is None:
+            return None
+        title, year, publisher, topics, authors = record
+        values = {"id": paper_id, "title": title, "year": year, "publisher": publisher}
+        result = {}
+        for field in fields:
+            if field == "topics":
+                result[field] = [{"uri": topic, "label": self.topic_labels[topic]}
+                                 for topic in topics if topic in self.topic_labels]
+            elif field == "authors":
+                result[field] = [{"uri": author, "name": self.author_names[author]}
+                                 for author in authors if author in self.author_names]
+            else:
+                result[field] = values[field]
+        return result
+
+    def paper_page(self, after=None, limit=100):
+        """Ids of the papers following ``after`` and the cursor of the next page, or None."""
+        start = bisect_right(self.paper_ids, after) if after else 0
+        ids = self.paper_ids[start:start + limit]
+        return ids, ids[-1] if ids and start + limit < len(self.paper_ids) else None
+
+    def topic_page(self, after=None, limit=100, fields=TOPIC_FIELDS):
+        """
+        Topics following the topic ``after`` by number of papers, and the cursor
+        of the next page. Raises KeyError if ``after`` is not a topic.
+        """
+        start = self.topic_positions[after] + 1 if after else 0
+        page = self.topics[start:start + limit]
+        topics = [{field: value for field, value in zip(TOPIC_FIELDS, topic) if field in fields}
+                  for topic in page]
+        return topics, page[-1][0] if page and start + limit < len(self.topics) else None
@@ -0,0 +1,226 @@
+import logging
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from rdflib import Graph
+
+# Queries evaluated at the same time, and admitted queries waiting for a worker
+SPARQL_WORKERS = int(os.environ.get("SPARQL_WORKERS", 4))
+SPARQL_QUEUE_SIZE = int(os.environ.get("SPARQL_QUEUE_SIZE", 16))
+# Wall-clock limit of a query, from admission to its last result row
+SPARQL_QUERY_TIMEOUT = float(os.environ.get("SPARQL_QUERY_TIMEOUT", 30))
+# Queries that take longer are written to the slow query log
+SPARQL_SLOW_QUERY_SECONDS = float(os.environ.get("SPARQL_SLOW_QUERY_SECONDS", 1))
+
+# Result chunks a worker can produce ahead of the client reading them
+STREAM_BUFFER = 16
+# Triples a query reads between two checks of its deadline
+CHECK_INTERVAL = 256
+
+slow_query_log = logging.getLogger("sparql.slow")
+
+class QueryTimeout(Exception):
+    """The query ran past its deadline or its client went away."""
+
+class Overloaded(Exception):
+    """Every worker and queue slot is taken."""
+
+    def __init__(self, queue_depth):
+        super().__init__(f"Too many queries in progress ({queue_depth} waiting)")
+        self.queue_depth = queue_depth
+
+# Query running on the current worker thread
+_current = threading.local()
+
+def check_deadline():
+    task = getattr(_current, "task", None)
+    if task is not None and task.expired():
+        if task.cancelled.is_set():
+            raise QueryTimeout("Query cancelled")
+        task.timed_out = True
+        raise QueryTimeout("Query timed out")
+
+class CancellableGraph(Graph):
+    """
+    Graph whose triple lookups stop the query running on a worker once its
+    deadline passes or it is cancelled.
+
+    Python threads cannot be interrupted, so cancellation is cooperative:
+    rdflib evaluates every graph pattern through triples(), where the
+    deadline is checked every CHECK_INTERVAL triples.
+    """
+
+    def triples(self, triple):
+        check_deadline()
+        for i, found in enumerate(super().triples(triple), 1):
+            if not i % CHECK_INTERVAL:
+                check_deadline()
+            yield found
+
+_DONE = object()
+
+class QueryTask:
+    """Chunks of a query result, produced on a worker and read by the request thread."""
+
+    def __init__(self, query, timeout):
+        self.query = query
+        self.admitted = time.monotonic()
+        self.deadline = self.admitted + timeout
+        self.cancelled = threading.Event()
+        self.chunks = queue.Queue(maxsize=STREAM_BUFFER)
+        self.started = None
+        self.seconds = None
+        self.timed_out = False
+
+    def expired(self):
+        return self.cancelled.is_set() or time.monotonic() > self.deadline
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def put(self, item):
+        # Wait for the client to read, but not past the deadline
+        while True:
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                check_deadline()
+
+    def get(self):
+        """Return the next chunk, or None at the end; raises the query's error."""
+        try:
+            item = self.chunks.get(timeout=max(self.deadline - time.monotonic(), 0) + 1)
+        except queue.Empty:
+            # The worker is stuck in a step that does not read triples
+            self.cancel()
+            raise QueryTimeout("Query timed out")
+        if item is _DONE:
+            return None
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+class QueryExecutor:
+    """
+    Bounded pool of workers that evaluate SPARQL queries.
+
+    At most ``workers`` queries run at once and ``queue_size`` more wait for
+    a worker; further queries are rejected with Overloaded. Every query has
+    a wall-clock deadline counted from its admission, and queries slower
+    than SPARQL_SLOW_QUERY_SECONDS are logged with their text and duration.
+    """
+
+    def __init__(self, workers=SPARQL_WORKERS, queue_size=SPARQL_QUEUE_SIZE):
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sparql")
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.lock = threading.Lock()
+        self.admitted = 0
+        self.running = 0
+        self.rejected = 0
+        self.timeouts = 0
+        # Moving average of the query durations, for Retry-After hints
+        self.mean_seconds = 0.0
+        self.slow_queries = deque(maxlen=50)
+
+    def queue_depth(self):
+        with self.lock:
+            return self.admitted - self.running
+
+    def retry_after(self):
+        """Seconds until a rejected query is likely to be admitted"""
+        with self.lock:
+            waves = (self.admitted - self.running) / self.workers + 1
+            return max(1, math.ceil(waves * self.mean_seconds))
+
+    def stream(self, query, produce, timeout=SPARQL_QUERY_TIMEOUT, on_done=None):
+        """
+        Run ``produce()``, an iterator of result chunks, on a worker and
+        return the QueryTask to read them from. ``on_done()`` is called on
+        the worker when the query ends, however it ends. Raises Overloaded
+        if the query cannot be admitted.
+        """
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise Overloaded(self.queue_depth())
+        task = QueryTask(query, timeout)
+        with self.lock:
+            self.admitted += 1
+        self.pool.submit(self._run, task, produce, on_done)
+        return task
+
+    def _run(self, task, produce, on_done):
+        with self.lock:
+            self.running += 1
+        task.started = time.monotonic()
+        _current.task = task
+        status = "ok"
+        try:
+            check_deadline()
+            for chunk in produce():
+                task.put(chunk)
+            task.seconds = time.monotonic() - task.started
+            task.put(_DONE)
+            # Results cut short by the deadline are sent, marked as truncated
+            if task.timed_out:
+                status = "timeout"
+        except QueryTimeout as e:
+            status = "timeout" if task.timed_out else "cancelled"
+            self._put_nowait(task, e)
+        except Exception as e:
+            status = "error"
+            self._put_nowait(task, e)
+        finally:
+            _current.task = None
+            if task.seconds is None:
+                task.seconds = time.monotonic() - task.started
+            with self.lock:
+                self.running -= 1
+                self.admitted -= 1
+                if status == "timeout":
+                    self.timeouts += 1
+                self.mean_seconds += 0.1 * (task.seconds - self.mean_seconds)
+            self.slots.release()
+            if on_done is not None:
+                on_done()
+            self._log(task, status)
+
+    @staticmethod
+    def _put_nowait(task, error):
+        # The reader may be gone, or behind on a full buffer: drop pending chunks
+        while True:
+            try:
+                task.chunks.put_nowait(error)
+                return
+            except queue.Full:
+                try:
+                    task.chunks.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _log(self, task, status):
+        queued = task.started - task.admitted
+        if queued + task.seconds < SPARQL_SLOW_QUERY_SECONDS:
+            return
+        entry = {"query": task.query, "seconds": round(task.seconds, 3), "queued_seconds": round(queued, 3),
+                 "status": status, "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with self.lock:
+            self.slow_queries.append(entry)
+        slow_query_log.warning(f"Slow query ({status}, {task.seconds:.2f}s + {queued:.2f}s queued): {task.query}")
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "running": self.running,
+                "queued": self.admitted - self.running,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "slow_queries": list(self.slow_queries),
+            }
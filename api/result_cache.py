@@ -0,0 +1,116 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# Memory budget of the query result cache
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+# Larger results are not cached
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.environ.get("RESULT_CACHE_MAX_ENTRY_BYTES", 16 * 1024 ** 2))
+
+# String literals, IRIs and escapes in prefixed names (ex:a\#b) are kept
+# verbatim; runs of whitespace and comments outside them are collapsed
+# into one space
+_QUERY_TOKENS = re.compile(r'''
+    "{3}(?:[^"\\]|\\.|"(?!""))*"{3}
+  | '{3}(?:[^'\\]|\\.|'(?!''))*'{3}
+  | "(?:[^"\\\n]|\\.)*"
+  | '(?:[^'\\\n]|\\.)*'
+  | <[^<>"{}|^`\\\s]*>
+  | \\.
+  | (?P<blank>(?:\s|\#[^\n]*)+)
+''', re.VERBOSE)
+
+def normalize_query(query):
+    """Return the text of a SPARQL query without comments and redundant whitespace."""
+    return _QUERY_TOKENS.sub(lambda m: " " if m.group("blank") else m.group(0), query).strip()
+
+class ResultCache:
+    """
+    In-memory LRU cache of serialized query results, bounded by their size.
+
+    Keys are (graph version, normalized query, result format) tuples, so a
+    reloaded graph never serves stale results; entries of the previous
+    version are dropped with retain() once the new one is served.
+    Each entry also records how long its result took to evaluate.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, max_entry_bytes=RESULT_CACHE_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _entry_size(key, body):
+        return len(body) + sum(len(str(part)) for part in key)
+
+    def get(self, key):
+        """Return the (body, evaluation seconds) cached for ``key``, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            entry["hits"] += 1
+            return entry["body"], entry["seconds"]
+
+    def put(self, key, body, seconds):
+        """Cache ``body`` for ``key``, evicting least recently used entries to make room."""
+        size = self._entry_size(key, body)
+        if size > self.max_entry_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous["size"]
+            self.entries[key] = {"body": body, "seconds": seconds, "size": size, "hits": 0}
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted["size"]
+                self.evictions += 1
+
+    def hottest(self, version, count):
+        """Keys of the ``count`` entries of ``version`` with the most hits."""
+        with self.lock:
+            keys = [(entry["hits"], key) for key, entry in self.entries.items() if key[0] == version]
+        return [key for _, key in sorted(keys, reverse=True)[:count]]
+
+    def retain(self, version):
+        """Drop the entries of every graph version but ``version``."""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] != version]:
+                self.size -= self.entries.pop(key)["size"]
+
+    def stats(self, top=20):
+        """Hit ratio, memory use and the cached queries that were slowest to evaluate."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            slowest = sorted(self.entries.items(), key=lambda item: item[1]["seconds"], reverse=True)[:top]
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "slowest_queries": [
+                    {
+                        "graph_version": key[0],
+                        "query": key[1],
+                        "format": key[2],
+                        "evaluation_ms": round(entry["seconds"] * 1000, 3),
+                        "hits": entry["hits"],
+                        "bytes": entry["size"],
+                    }
+                    for key, entry in slowest
+                ],
+            }
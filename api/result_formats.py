@@ -0,0 +1,115 @@
+import itertools
+import json
+import os
+from rdflib import BNode, Literal, URIRef
+
+# Largest number of rows a SPARQL response returns
+SPARQL_MAX_ROWS = int(os.environ.get("SPARQL_MAX_ROWS", 100000))
+# Serialized rows are sent in chunks of about this many bytes
+CHUNK_BYTES = 64 * 1024
+
+MIMETYPES = {
+    "json": "application/sparql-results+json",
+    "csv": "text/csv",
+    "tsv": "text/tab-separated-values",
+}
+# Accepted media types, in order of preference, and the format they select
+ACCEPT = {
+    "application/sparql-results+json": "json",
+    "application/json": "json",
+    "text/csv": "csv",
+    "text/tab-separated-values": "tsv",
+}
+
+def json_term(value):
+    if isinstance(value, Literal):
+        term = {"type": "literal", "value": str(value)}
+        if value.language:
+            term["xml:lang"] = value.language
+        if value.datatype:
+            term["datatype"] = str(value.datatype)
+        return term
+    if isinstance(value, URIRef):
+        return {"type": "uri", "value": str(value)}
+    return {"type": "literal", "value": str(value)}
+
+def csv_term(value):
+    if value is None:
+        return ""
+    text = f"_:{value}" if isinstance(value, BNode) else str(value)
+    if any(c in text for c in ',"\r\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+def tsv_term(value):
+    """Term in the N-Triples-like syntax of the SPARQL TSV results format."""
+    if value is None:
+        return ""
+    if isinstance(value, URIRef):
+        return f"<{value}>"
+    if isinstance(value, BNode):
+        return f"_:{value}"
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    text = text.replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t")
+    if isinstance(value, Literal) and value.language:
+        return f'"{text}"@{value.language}'
+    if isinstance(value, Literal) and value.datatype:
+        return f'"{text}"^^<{value.datatype}>'
+    return f'"{text}"'
+
+def serialize_results(fmt, variables, rows, max_rows=SPARQL_MAX_ROWS, stop=()):
+    """
+    Serialize result rows (tuples of terms, None when unbound) one at a time.
+
+    Yields pieces of text in the SPARQL JSON, CSV or TSV results format. It
+    stops after ``max_rows`` rows, or when reading a row raises one of the
+    ``stop`` exceptions; a truncated JSON result has a top-level
+    ``"truncated": true`` member. JSON results are written like Flask's
+    jsonify() outside debug mode: compact, with sorted keys, ASCII escapes
+    and a final newline.
+    """
+    truncated = False
+    names = [str(var) for var in variables]
+
+    if fmt == "json":
+        yield json.dumps({"head": {"vars": names}}, separators=(",", ":"))[:-1] + ',"results":{"bindings":['
+    elif fmt == "csv":
+        yield ",".join(csv_term(name) for name in names) + "\r\n"
+    else:
+        yield "\t".join("?" + name for name in names) + "\n"
+
+    rows = iter(rows)
+    for i in itertools.count():
+        try:
+            row = next(rows)
+        except StopIteration:
+            break
+        except stop:
+            truncated = True
+            break
+        if i == max_rows:
+            truncated = True
+            break
+        if fmt == "json":
+            binding = {name: json_term(value) for name, value in zip(names, row) if value is not None}
+            yield ("," if i else "") + json.dumps(binding, sort_keys=True, separators=(",", ":"))
+        elif fmt == "csv":
+            yield ",".join(csv_term(value) for value in row) + "\r\n"
+        else:
+            yield "\t".join(tsv_term(value) for value in row) + "\n"
+
+    if fmt == "json":
+        yield "]}" + (',"truncated":true' if truncated else "") + "}\n"
+
+def chunked(pieces, size=CHUNK_BYTES):
+    """Group text pieces into UTF-8 chunks of about ``size`` bytes."""
+    buffer, length = [], 0
+    for piece in pieces:
+        data = piece.encode("utf-8")
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b"".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b"".join(buffer)
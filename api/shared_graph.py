@@ -0,0 +1,221 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from flask import appcontext_tearing_down, g
+from graph_loader import load_graph, graph_version
+from query_executor import CancellableGraph
+from search.inverted_index import SEARCH_INDEX_DIR, index_version
+from similarity.neighbors import NEIGHBORS_DIR, neighbors_version
+
+# Output folder of the pipeline
+OUTPUT_FOLDER = os.environ.get(
+    "GRAPH_OUTPUT_FOLDER",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app", "output")
+)
+# Seconds between checks for a new graph written by the pipeline; 0 disables them
+GRAPH_RELOAD_INTERVAL = float(os.environ.get("GRAPH_RELOAD_INTERVAL", 30))
+
+logger = logging.getLogger(__name__)
+
+def served_version(output_folder):
+    """
+    Version of the graph and of the search index and neighbour lists the
+    services read from ``output_folder``.
+    """
+    version = graph_version(output_folder)
+    indexes = [index_version(os.path.join(output_folder, SEARCH_INDEX_DIR)),
+               neighbors_version(os.path.join(output_folder, NEIGHBORS_DIR))]
+    if indexes == [None, None]:
+        return version
+    return hashlib.sha256(json.dumps([version, *indexes]).encode("utf-8")).hexdigest()[:16]
+
+class GraphState:
+    """
+    A loaded graph, its version and the structures the services derive from it.
+
+    Requests and queries acquire() the state while they use it. A state
+    replaced by a reload is retired, and its store is closed when the last
+    of them releases it.
+    """
+
+    def __init__(self, graph, version):
+        self.graph = graph
+        self.version = version
+        self.derived = {}
+        self.loaded_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.users = 0
+        self.retired = False
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            self.users += 1
+        return self
+
+    def release(self):
+        with self.lock:
+            self.users -= 1
+            close = self.retired and not self.users
+        if close:
+            self.close()
+
+    def retire(self):
+        with self.lock:
+            self.retired = True
+            close = not self.users
+        if close:
+            self.close()
+
+    def close(self):
+        self.graph.close()
+        self.derived.clear()
+
+class GraphHolder:
+    """
+    The graph served by the services of a process, replaced without downtime.
+
+    Requests acquire the state once (served_state()) and use it until they
+    end, so in-flight requests finish on the version they started with. reload()
+    loads a new version next to the current one, builds its derived
+    structures and runs the warmers on it, and only then swaps it in.
+    """
+
+    def __init__(self, output_folder, graph_class=CancellableGraph):
+        self.output_folder = output_folder
+        self.graph_class = graph_class
+        self.builders = {}
+        self.warmers = []
+        self.listeners = []
+        # One reload at a time
+        self.reload_lock = threading.Lock()
+        # Guards swapping the served state against requests acquiring it
+        self.swap_lock = threading.Lock()
+        self.reloads = 0
+        self.last_error = None
+        self.watcher_pid = None
+        self.state = self._load()
+
+    def _load(self):
+        # Files replaced while they were opened are opened again
+        version = served_version(self.output_folder)
+        while True:
+            state = GraphState(load_graph(self.output_folder, self.graph_class), version)
+            for name, build in self.builders.items():
+                state.derived[name] = build(state.graph)
+            version = served_version(self.output_folder)
+            if version == state.version:
+                return state
+
+    def acquire(self):
+        """Return the served state, kept open until it is released."""
+        with self.swap_lock:
+            return self.state.acquire()
+
+    def derive(self, name, build):
+        """Keep ``build(graph)`` in ``state.derived[name]`` for this and every later graph."""
+        with self.reload_lock:
+            self.builders[name] = build
+            self.state.derived[name] = build(self.state.graph)
+
+    def add_warmer(self, warm):
+        """Call ``warm(old_state, new_state)`` on each new graph before it is served."""
+        self.warmers.append(warm)
+
+    def add_listener(self, listener):
+        """Call ``listener(new_state)`` each time a new graph is served."""
+        self.listeners.append(listener)
+
+    def reload(self, force=False):
+        """
+        Serve the graph in the output folder if its version changed (or if
+        ``force``). Returns True if a new graph was swapped in.
+        """
+        with self.reload_lock:
+            return self._reload(force)
+
+    def _reload(self, force):
+        if not force and served_version(self.output_folder) == self.state.version:
+            return False
+        start = time.perf_counter()
+        old, new = self.state, self._load()
+        for warm in self.warmers:
+            warm(old, new)
+        with self.swap_lock:
+            self.state = new
+        # Requests still using the previous graph finish before it is closed
+        old.retire()
+        self.reloads += 1
+        logger.info(f"Graph version {new.version} served after loading it in {time.perf_counter() - start:.1f}s")
+        for listener in self.listeners:
+            listener(new)
+        return True
+
+    def _reload_logged(self, force=False):
+        # Runs with the reload lock held
+        try:
+            self._reload(force)
+            self.last_error = None
+        except Exception as e:
+            # The current graph is still served
+            self.last_error = str(e)
+            logger.exception("Error reloading the graph")
+        finally:
+            self.reload_lock.release()
+
+    def reload_in_background(self, force=False):
+        """Start a reload on a thread; returns False if one is already running."""
+        if not self.reload_lock.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._reload_logged, args=(force,), daemon=True, name="graph-reload").start()
+        return True
+
+    def watch(self, interval=GRAPH_RELOAD_INTERVAL):
+        """Start a thread reloading the graph when the pipeline writes a new version."""
+        # Threads do not survive fork(): each worker process starts its own
+        if interval <= 0 or self.watcher_pid == os.getpid():
+            return
+        self.watcher_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(interval)
+                if self.reload_lock.acquire(blocking=False):
+                    self._reload_logged()
+
+        threading.Thread(target=run, daemon=True, name="graph-watcher").start()
+
+    def status(self):
+        state = self.acquire()
+        try:
+            return {
+                "version": state.version,
+                "loaded_at": state.loaded_at,
+                "store": type(state.graph.store).__name__,
+                "triples": len(state.graph),
+                "reloading": self.reload_lock.locked(),
+                "reloads": self.reloads,
+                "last_error": self.last_error,
+            }
+        finally:
+            state.release()
+
+# Graph of every service of the process. When the WSGI server loads the
+# app before forking, the workers share its pages until they reload it.
+holder = GraphHolder(OUTPUT_FOLDER)
+
+def served_state():
+    """State of the graph served to the current request, read once per request."""
+    if "graph_state" not in g:
+        g.graph_state = holder.acquire()
+    return g.graph_state
+
+def _release_served_state(sender, **kwargs):
+    # Streamed responses outlive the request context: their queries hold their own reference
+    state = g.pop("graph_state", None)
+    if state is not None:
+        state.release()
+
+appcontext_tearing_down.connect(_release_served_state)
@@ -1,63 +1,199 @@
+import itertools
+import logging
 import os
-from flask import Flask, request, jsonify
-from rdflib import Graph, URIRef, Literal
-
-app = Flask(__name__)
-
-# Load RDF data
-graph = Graph()
-rdf_path = os.path.join(os.path.dirname(__file__), "..", "app", "output", "papers_wikidata_enriched.ttl")
-graph.parse(rdf_path, format="turtle")
-
-def rdflib_result_to_sparql_json(results):
-    vars = results.vars
-    bindings = []
-    for row in results:
-        binding = {}
-        for idx, var in enumerate(vars):
-            val = row[idx]
-            if val is not None:
-                if isinstance(val, Literal):
-                    value = {
-                        "type": "literal",
-                        "value": str(val)
-                    }
-                    if val.language:
-                        value["xml:lang"] = val.language
-                    if val.datatype:
-                        value["datatype"] = str(val.datatype)
-                elif isinstance(val, URIRef):
-                    value = {
-                        "type": "uri",
-                        "value": str(val)
-                    }
+import threading
+import time
+from functools import lru_cache
+from flask import Blueprint, Flask, Response, request, jsonify
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.evaluate import evalQuery
+from shared_graph import holder, served_state
+from admin import admin_blueprint
+from http_cache import make_etag, not_modified, set_cache_headers
+from result_cache import ResultCache, normalize_query
+from result_formats import ACCEPT, MIMETYPES, SPARQL_MAX_ROWS, serialize_results, chunked
+from query_executor import QueryExecutor, QueryTimeout, Overloaded, SPARQL_QUERY_TIMEOUT
+
+sparql_blueprint = Blueprint("sparql", __name__)
+logger = logging.getLogger(__name__)
+
+# Queries run on a bounded pool of workers, each with a deadline
+executor = QueryExecutor()
+
+# Serialized results of recent queries, keyed by graph version and query text
+result_cache = ResultCache()
+
+# Number of query texts whose parsed and translated form is kept
+QUERY_PARSE_CACHE_SIZE = int(os.environ.get("QUERY_PARSE_CACHE_SIZE", 1024))
+# Most requested cached queries evaluated on a reloaded graph before it is served
+RESULT_CACHE_WARM_QUERIES = int(os.environ.get("RESULT_CACHE_WARM_QUERIES", 20))
+
+# rdflib's pyparsing grammar is not thread-safe
+parse_lock = threading.Lock()
+
+@lru_cache(maxsize=QUERY_PARSE_CACHE_SIZE)
+def prepare_query(query):
+    """Parse and translate a query once, with the prefixes bound in the graph."""
+    with parse_lock:
+        return prepareQuery(query, initNs=dict(holder.state.graph.namespaces()))
+
+def iter_rows(result):
+    """Rows of a SELECT result as tuples of terms, without keeping them."""
+    variables = result["vars_"]
+    for binding in result["bindings"]:
+        # Like rdflib's Result, skip empty solutions
+        if binding:
+            yield tuple(binding.get(var) for var in variables)
+
+def result_format():
+    """
+    Results format chosen by the ``format`` parameter or the Accept header.
+    JSON, the default, is sent as application/sparql-results+json, the
+    SPARQL media type, also to clients asking for application/json.
+    """
+    if "format" in request.args:
+        return request.args["format"]
+    return ACCEPT[request.accept_mimetypes.best_match(list(ACCEPT), default="application/sparql-results+json")]
+
+def produce_results(graph, prepared, fmt):
+    """Function evaluating a query on a worker and serializing its rows in chunks"""
+    def produce():
+        result = evalQuery(graph, prepared, {})
+        rows = iter_rows(result)
+        # A query past its deadline before its first row fails; later, it
+        # ends with the rows produced so far
+        first = next(rows, None)
+        if first is not None:
+            rows = itertools.chain([first], rows)
+        yield from chunked(serialize_results(fmt, result["vars_"], rows, stop=(QueryTimeout,)))
+    return produce
+
+def stream_results(key, task, chunk):
+    """
+    Result chunks read from a query task, starting with ``chunk``. The
+    result is cached if it is complete and fits in a cache entry.
+    """
+    body, size = [], 0
+    try:
+        while chunk is not None:
+            if body is not None:
+                size += len(chunk)
+                if size > result_cache.max_entry_bytes:
+                    body = None
                 else:
-                    value = {
-                        "type": "literal",
-                        "value": str(val)
-                    }
-                binding[str(var)] = value
-        bindings.append(binding)
-    return {
-        "head": {"vars": [str(v) for v in vars]},
-        "results": {"bindings": bindings}
-    }
-
-@app.route('/sparql', methods=['GET', 'POST'])
+                    body.append(chunk)
+            yield chunk
+            chunk = task.get()
+    except Exception:
+        # The status line is already sent: end the truncated response
+        logger.exception("Error streaming the results of a SPARQL query")
+        body = None
+    finally:
+        # Stops the worker if the client went away
+        task.cancel()
+    if body is not None and not task.timed_out:
+        result_cache.put(key, b"".join(body), task.seconds)
+
+def warm_result_cache(old, new):
+    """Cache the results of the most requested queries on a graph before it is served"""
+    for _, query, fmt in result_cache.hottest(old.version, RESULT_CACHE_WARM_QUERIES):
+        start = time.perf_counter()
+        try:
+            result = evalQuery(new.graph, prepare_query(query), {})
+            body = b"".join(chunked(serialize_results(fmt, result["vars_"], iter_rows(result))))
+        except Exception:
+            logger.exception(f"Error warming the result cache with: {query}")
+            continue
+        result_cache.put((new.version, query, fmt), body, time.perf_counter() - start)
+
+holder.add_warmer(warm_result_cache)
+holder.add_listener(lambda state: result_cache.retain(state.version))
+
+@sparql_blueprint.route('/sparql', methods=['GET', 'POST'])
 def sparql_query():
     query = request.args.get('query') if request.method == 'GET' else request.json.get('query')
     
     if not query:
         return jsonify({"error": "No SPARQL query provided"}), 400
+
+    fmt = result_format()
+    if fmt not in MIMETYPES:
+        return jsonify({"error": f"Unsupported format, use one of: {', '.join(MIMETYPES)}"}), 400
     
+    # The whole request uses the graph served when it started
+    state = served_state()
+    # The normalized text only identifies the result; the query as sent is
+    # what runs
+    key = (state.version, normalize_query(query), fmt)
+    # Repeated GET requests are revalidated before the query is even parsed
+    etag = make_etag(*key)
+    if request.method == 'GET':
+        response = not_modified(etag, vary="Accept")
+        if response is not None:
+            return response
+
+    cached = result_cache.get(key)
+    if cached is not None:
+        body, seconds = cached
+        response = Response(body, mimetype=MIMETYPES[fmt])
+        if request.method == 'GET':
+            set_cache_headers(response, etag, vary="Accept")
+        response.headers["X-Cache"] = "HIT"
+        # Evaluation time of the cached result
+        response.headers["X-Query-Time"] = f"{seconds * 1000:.1f}ms"
+        return response
+
+    try:
+        prepared = prepare_query(query)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    if prepared.algebra.name != "SelectQuery":
+        return jsonify({"error": "Only SELECT queries are supported"}), 400
+
+    start = time.perf_counter()
+    # The query keeps the graph open until it ends, after the request is gone
+    state.acquire()
     try:
-        results = graph.query(query)
-        sparql_json = rdflib_result_to_sparql_json(results)
-        return jsonify(sparql_json)
+        task = executor.stream(query, produce_results(state.graph, prepared, fmt), on_done=state.release)
+    except Overloaded as e:
+        state.release()
+        response = jsonify({"error": str(e), "queue_depth": e.queue_depth})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(executor.retry_after())
+        response.headers["X-Queue-Depth"] = str(e.queue_depth)
+        return response
+
+    # Wait for the first chunk, so that query errors still get an error status
+    try:
+        first = task.get()
+    except QueryTimeout as e:
+        return jsonify({"error": f"{e} (limit {SPARQL_QUERY_TIMEOUT:g}s)"}), 504
     except Exception as e:
         return jsonify({"error": str(e)}), 400
+    seconds = time.perf_counter() - start
+
+    response = Response(stream_results(key, task, first), mimetype=MIMETYPES[fmt])
+    # Whether the result is complete is only known once it is sent: only
+    # cached results, which are complete, get an ETag
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Cache"] = "MISS"
+    # Time to the first chunk; the rest of the result is evaluated while it is sent
+    response.headers["X-Query-Time"] = f"{seconds * 1000:.1f}ms"
+    response.headers["X-Row-Limit"] = str(SPARQL_MAX_ROWS)
+    return response
+
+@sparql_blueprint.route('/sparql/stats', methods=['GET'])
+def sparql_stats():
+    """Result cache hit ratio and evaluation times of the cached queries"""
+    stats = result_cache.stats()
+    stats["graph_version"] = holder.state.version
+    stats["executor"] = executor.stats()
+    parse_cache = prepare_query.cache_info()
+    stats["parse_cache"] = {"hits": parse_cache.hits, "misses": parse_cache.misses,
+                            "entries": parse_cache.currsize, "max_entries": parse_cache.maxsize}
+    return jsonify(stats)
 
-@app.route('/')
+@sparql_blueprint.route('/')
 def index():
     default_query = """PREFIX dcterms: <http://purl.org/dc/terms/>
 PREFIX foaf: <http://xmlns.com/foaf/0.1/>
@@ -109,4 +245,8 @@ LIMIT 20
     """
 
 if __name__ == '__main__':
+    app = Flask(__name__)
+    app.register_blueprint(sparql_blueprint)
+    app.register_blueprint(admin_blueprint)
+    holder.watch()
     app.run(debug=True, port=5000, host='0.0.0.0')
\ No newline at end of file
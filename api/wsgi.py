@@ -0,0 +1,28 @@
+"""
+WSGI application serving the REST API and the SPARQL endpoint together.
+
+Run it with the production server configuration (from the api folder):
+    python -m gunicorn --config gunicorn.conf.py wsgi:app
+"""
+import gc
+from flask import Flask
+from admin import admin_blueprint
+from api import api_blueprint
+from shared_graph import holder
+from sparql_endpoint import sparql_blueprint
+
+def create_app():
+    app = Flask(__name__)
+    app.register_blueprint(api_blueprint)
+    app.register_blueprint(sparql_blueprint)
+    app.register_blueprint(admin_blueprint)
+    return app
+
+app = create_app()
+
+# The graph and the API indexes are loaded by now. Moving them out of the
+# garbage collector's generations keeps its passes from writing to their
+# pages, so forked workers keep sharing them instead of copying them.
+gc.freeze()
+# A reloaded graph replaces the frozen one, which the collector can then free
+holder.add_listener(lambda state: gc.unfreeze())
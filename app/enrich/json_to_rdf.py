@@ -1,70 +1,375 @@
+import hashlib
 import json
+import os
+from collections import Counter
 from rdflib import Graph, URIRef, Literal, Namespace
 from rdflib.namespace import RDF, DCTERMS, FOAF, SKOS
-def json_to_rdf(file_path, output_path):
-    # Cargar archivo JSON enriquecido
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+from rdflib.util import guess_format
+from pipeline.papers_jsonl import read_papers
+from pipeline.manifest import fingerprint_code
+from enrich.openalex_query import normalize_doi
 
-    if data is None:
-        print(f"❌ Error: can't open file {file_path}")
-        return 1
+# Namespaces
+EX = Namespace("http://example.org/resource/")
+BIBO = Namespace("http://purl.org/ontology/bibo/")
+TOPIC_BASE = "http://example.org/topic/"
 
-    papers = data["papers"]
+# Campos de un paper que se convierten en tripletas
+RDF_FIELDS = ("title", "doi", "publicationYear", "publishedIn", "authors", "openalex_topics")
 
-    # Crear grafo RDF
-    g = Graph()
+# Escapes de N-Triples para literales e IRIs
+_LITERAL_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r"})
+_IRI_ESCAPES = str.maketrans({c: f"\\u{ord(c):04X}" for c in '<>"{}|^`\\ \t\n\r'})
+
+def _author_name(author):
+    return " ".join(filter(None, [
+        author.get("firstname", "").strip(),
+        author.get("middlename", "").strip(),
+        author.get("lastname", "").strip()
+    ]))
+
+def _topic_uri(topic):
+    return f"{TOPIC_BASE}{topic.replace(' ', '_')}"
+
+def paper_id(paper):
+    """
+    Identificador estable de un paper, usado como nombre local de su URI.
+
+    Se deriva del DOI normalizado, o si no hay DOI de un hash del título y
+    los autores (del nombre de fichero si tampoco hay título), así que no
+    cambia al añadir o quitar otros papers del corpus.
+    """
+    doi = normalize_doi(paper.get("doi"))
+    if doi:
+        key = f"doi:{doi}"
+    elif paper.get("title"):
+        title = " ".join(paper["title"].lower().split())
+        authors = "|".join(_author_name(author).lower() for author in paper.get("authors", []))
+        key = f"content:{title}|{authors}"
+    else:
+        key = f"file:{paper.get('filename', '')}"
+    return "paper_" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def paper_fingerprint(paper):
+    """Hash de los campos del paper que aparecen en el grafo."""
+    fields = json.dumps({key: paper.get(key) for key in RDF_FIELDS}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(fields.encode("utf-8")).hexdigest()
+
+def _author_id(pid, i):
+    return f"author_{pid[len('paper_'):]}_{i}"
+
+def unique_papers(papers):
+    """Itera sobre (id, paper) descartando los papers con un id repetido."""
+    seen = set()
+    for paper in papers:
+        pid = paper_id(paper)
+        if pid in seen:
+            print(f"⚠️ Paper duplicado, se ignora: {paper.get('filename') or paper.get('title')}")
+            continue
+        seen.add(pid)
+        yield pid, paper
+
+def paper_triples(pid, paper):
+    """
+    Genera las tripletas (s, p, o) de un paper como términos de rdflib.
+
+    Los topicos se declaran cada vez que aparecen; en un Graph las
+    tripletas repetidas se ignoran.
+    """
+    paper_uri = EX[pid]
+    yield paper_uri, RDF.type, BIBO.Document
+
+    # Título
+    if paper.get("title"):
+        yield paper_uri, DCTERMS.title, Literal(paper["title"])
+
+    # DOI
+    if paper.get("doi"):
+        yield paper_uri, BIBO.doi, Literal(paper["doi"])
 
-    # Namespaces
-    EX = Namespace("http://example.org/resource/")
-    BIBO = Namespace("http://purl.org/ontology/bibo/")
+    # Fecha
+    if paper.get("publicationYear"):
+        yield paper_uri, DCTERMS.issued, Literal(paper["publicationYear"])
+
+    # Revista
+    if paper.get("publishedIn"):
+        yield paper_uri, DCTERMS.publisher, Literal(paper["publishedIn"])
+
+    # Autores
+    for i, author in enumerate(paper.get("authors", [])):
+        author_uri = EX[_author_id(pid, i)]
+        yield author_uri, RDF.type, FOAF.Person
+        yield author_uri, FOAF.name, Literal(_author_name(author))
+        yield paper_uri, DCTERMS.creator, author_uri
+
+    # Temas desde OpenAlex (topics)
+    for topic in paper.get("openalex_topics", []):
+        topic_uri = URIRef(_topic_uri(topic))
+        yield topic_uri, RDF.type, SKOS.Concept
+        yield topic_uri, SKOS.prefLabel, Literal(topic)
+        yield paper_uri, DCTERMS.subject, topic_uri
+
+def _nt_iri(iri):
+    return f"<{iri.translate(_IRI_ESCAPES)}>"
+
+def _nt_literal(value):
+    if isinstance(value, str):
+        return f'"{value.translate(_LITERAL_ESCAPES)}"'
+    # Números y otros tipos: rdflib elige el datatype XSD
+    return Literal(value).n3()
+
+_TYPE, _TITLE, _DOI, _ISSUED, _PUBLISHER, _CREATOR, _SUBJECT, _NAME, _PREF_LABEL = (
+    _nt_iri(p) for p in (RDF.type, DCTERMS.title, BIBO.doi, DCTERMS.issued, DCTERMS.publisher,
+                         DCTERMS.creator, DCTERMS.subject, FOAF.name, SKOS.prefLabel)
+)
+_DOCUMENT, _PERSON, _CONCEPT = (_nt_iri(c) for c in (BIBO.Document, FOAF.Person, SKOS.Concept))
+
+def paper_ntriples(pid, paper, topic_counts):
+    """
+    Devuelve las líneas N-Triples de un paper.
+
+    ``topic_counts`` cuenta los papers de cada topico y se actualiza con los
+    del paper; los topicos que aún no tienen papers se declaran, de modo que
+    cada topico se declara una sola vez.
+    """
+    paper_uri = _nt_iri(f"{EX}{pid}")
+    lines = [f"{paper_uri} {_TYPE} {_DOCUMENT} .\n"]
+    for key, predicate in (("title", _TITLE), ("doi", _DOI), ("publicationYear", _ISSUED), ("publishedIn", _PUBLISHER)):
+        if paper.get(key):
+            lines.append(f"{paper_uri} {predicate} {_nt_literal(paper[key])} .\n")
+
+    for i, author in enumerate(paper.get("authors", [])):
+        author_uri = _nt_iri(f"{EX}{_author_id(pid, i)}")
+        lines.append(f"{author_uri} {_TYPE} {_PERSON} .\n")
+        lines.append(f"{author_uri} {_NAME} {_nt_literal(_author_name(author))} .\n")
+        lines.append(f"{paper_uri} {_CREATOR} {author_uri} .\n")
+
+    for topic in paper.get("openalex_topics", []):
+        topic_uri = _nt_iri(_topic_uri(topic))
+        if not topic_counts[topic]:
+            lines.append(f"{topic_uri} {_TYPE} {_CONCEPT} .\n")
+            lines.append(f"{topic_uri} {_PREF_LABEL} {_nt_literal(topic)} .\n")
+        topic_counts[topic] += 1
+        lines.append(f"{paper_uri} {_SUBJECT} {topic_uri} .\n")
+    return lines
+
+def write_ntriples(papers, f, fingerprints=None, topic_counts=None):
+    """
+    Escribe los papers como N-Triples en el fichero abierto ``f``.
+
+    Las líneas se generan directamente a partir de cada paper, sin construir
+    un Graph, así que la memoria no depende del número de papers. Cada topico
+    se declara una sola vez. Si se pasa ``fingerprints`` se rellena con
+    {id del paper: huella}, y si se pasa ``topic_counts`` (un Counter) con
+    {topico: número de papers}. Devuelve el número de tripletas escritas.
+    """
+    topic_counts = Counter() if topic_counts is None else topic_counts
+    count = 0
+    for pid, paper in unique_papers(papers):
+        lines = paper_ntriples(pid, paper, topic_counts)
+        f.writelines(lines)
+        count += len(lines)
+        if fingerprints is not None:
+            fingerprints[pid] = paper_fingerprint(paper)
+    return count
+
+def papers_to_graph(papers):
+    """Construye un Graph de rdflib con los papers."""
+    g = Graph()
     g.bind("dcterms", DCTERMS)
     g.bind("foaf", FOAF)
     g.bind("bibo", BIBO)
     g.bind("skos", SKOS)
     g.bind("ex", EX)
+    for pid, paper in unique_papers(papers):
+        for triple in paper_triples(pid, paper):
+            g.add(triple)
+    return g
+
+def index_path(output_path):
+    """Fichero con la huella de cada paper del grafo ``output_path``."""
+    return os.path.splitext(output_path)[0] + ".index.json"
+
+def delta_paths(output_path):
+    """Ficheros N-Triples (añadidas, retiradas) de la última actualización incremental."""
+    base = os.path.splitext(output_path)[0]
+    return base + ".added.nt", base + ".removed.nt"
+
+def _code_version():
+    return fingerprint_code([__name__])
+
+def _graph_version(fingerprints, topic_counts):
+    """Versión de un grafo: hash de las huellas de sus papers y de sus topicos."""
+    payload = json.dumps([sorted(fingerprints.items()), sorted(topic_counts)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+def _save_index(path, fingerprints, topic_counts):
+    version = _graph_version(fingerprints, topic_counts)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"code": _code_version(), "version": version, "papers": fingerprints,
+                   "topics": dict(sorted(topic_counts.items()))}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _read_index(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _load_index(path):
+    index = _read_index(path)
+    # Si cambió la forma de generar las tripletas hay que reconstruir
+    return index if index is not None and index.get("code") == _code_version() else None
+
+def graph_version(output_path):
+    """Versión del grafo N-Triples ``output_path`` según su índice, o None."""
+    index = _read_index(index_path(output_path))
+    return index.get("version") if index else None
+
+def delta_versions(output_path):
+    """
+    Versiones (anterior, nueva) entre las que va el delta de ``output_path``.
+
+    Devuelve None si no hay delta, por ejemplo tras una reconstrucción completa.
+    """
+    try:
+        with open(delta_paths(output_path)[0], "r", encoding="utf-8") as f:
+            header = f.readline().split()
+    except OSError:
+        return None
+    if len(header) != 4 or header[:2] != ["#", "delta"]:
+        return None
+    return header[2], header[3]
+
+_PAPER_PREFIX = f"<{EX}paper_"
+_AUTHOR_PREFIX = f"<{EX}author_"
+_TOPIC_PREFIX = f"<{TOPIC_BASE}"
+
+def _subject_paper(line):
+    """Id del paper al que pertenece el sujeto de una línea N-Triples, o None."""
+    subject = line[:line.find(" ")]
+    if subject.startswith(_PAPER_PREFIX):
+        return subject[len(_PAPER_PREFIX):-1]
+    if subject.startswith(_AUTHOR_PREFIX):
+        return subject[len(_AUTHOR_PREFIX):].split("_", 1)[0]
+    return None
+
+def update_ntriples(papers, output_path):
+    """
+    Actualiza el grafo N-Triples ``output_path`` solo con los papers que cambiaron.
+
+    Compara la huella de cada paper con el índice de la ejecución anterior:
+    las tripletas de los papers nuevos o modificados se añaden y las de los
+    papers modificados o eliminados se retiran, igual que la declaración de
+    los topicos que se quedan sin papers. Las tripletas añadidas y
+    retiradas se guardan además en los ficheros de delta_paths(). Devuelve
+    (papers cambiados, tripletas añadidas, tripletas retiradas), o None si
+    no hay un grafo anterior compatible y hay que reconstruirlo entero.
+    """
+    index = _load_index(index_path(output_path))
+    if index is None or not os.path.exists(output_path):
+        return None
+
+    previous = index["papers"]
+    topic_counts = Counter(index["topics"])
+    fingerprints = {}
+    added = []
+    for pid, paper in unique_papers(papers):
+        fingerprint = paper_fingerprint(paper)
+        fingerprints[pid] = fingerprint
+        if previous.get(pid) != fingerprint:
+            added.extend(paper_ntriples(pid, paper, topic_counts))
+
+    # Papers modificados o eliminados, por el hash de su id
+    stale = {pid[len("paper_"):] for pid, fingerprint in previous.items()
+             if fingerprints.get(pid) != fingerprint}
+    changed = len(stale | {pid[len("paper_"):] for pid in fingerprints if pid not in previous})
+
+    # Las declaraciones de los topicos se escriben al final, cuando se sabe
+    # cuáles siguen usándose en algún paper
+    topic_uris = {_nt_iri(_topic_uri(topic)): topic for topic in topic_counts}
+    declarations = []
+    removed = []
+    tmp_path = output_path + ".tmp"
+    with open(output_path, "r", encoding="utf-8") as src, \
+         open(tmp_path, "w", encoding="utf-8") as dst:
+        for line in src:
+            if line.startswith(_TOPIC_PREFIX):
+                declarations.append(line)
+            elif stale and _subject_paper(line) in stale:
+                removed.append(line)
+                _, predicate, obj = line.split(" ", 2)
+                if predicate == _SUBJECT:
+                    topic_counts[topic_uris.get(obj[:obj.rfind(" ")])] -= 1
+            else:
+                dst.write(line)
+        for line in declarations:
+            if topic_counts[topic_uris.get(line[:line.find(" ")])] > 0:
+                dst.write(line)
+            else:
+                removed.append(line)
+        dst.writelines(added)
+    topic_counts = Counter({topic: count for topic, count in topic_counts.items() if topic and count > 0})
+
+    # Cabecera (comentario N-Triples) con las versiones entre las que va el delta
+    header = f"# delta {index.get('version')} {_graph_version(fingerprints, topic_counts)}\n"
+    added_path, removed_path = delta_paths(output_path)
+    for path, lines in ((added_path, added), (removed_path, removed)):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(header)
+            f.writelines(lines)
+    os.replace(tmp_path, output_path)
+    _save_index(index_path(output_path), fingerprints, topic_counts)
+    return changed, len(added), len(removed)
+
+def json_to_rdf(file_path, output_path, incremental=False):
+    """
+    Convierte los papers del archivo JSON Lines en RDF.
+
+    Si ``output_path`` termina en ``.nt`` las tripletas se escriben en
+    streaming como N-Triples, el formato de los ficheros intermedios. Con
+    cualquier otra extensión (por ejemplo ``.ttl``) se construye un Graph y
+    se serializa en el formato correspondiente, pensado para publicar.
+
+    Con ``incremental`` un grafo N-Triples existente se actualiza solo con
+    las tripletas de los papers que cambiaron (ver update_ntriples).
+    """
+    # Los papers del archivo JSON Lines enriquecido se leen de uno en uno
+    if not os.path.exists(file_path):
+        print(f"❌ Error: can't open file {file_path}")
+        return 1
+
+    papers = read_papers(file_path)
+
+    if not output_path.endswith(".nt"):
+        # Guardar RDF
+        g = papers_to_graph(papers)
+        g.serialize(output_path, format=guess_format(output_path) or "turtle")
+        print(f"✅ RDF enriquecido con topics guardado en '{output_path}'")
+        return 0
+
+    if incremental:
+        result = update_ntriples(papers, output_path)
+        if result is not None:
+            changed, added, removed = result
+            print(f"✅ RDF actualizado en '{output_path}': {changed} papers cambiados, "
+                  f"{added} tripletas añadidas, {removed} retiradas")
+            return 0
+        print("ℹ️ No hay un grafo anterior compatible, se reconstruye entero")
+
+    fingerprints = {}
+    topic_counts = Counter()
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        write_ntriples(papers, f, fingerprints, topic_counts)
+    os.replace(tmp_path, output_path)
+    _save_index(index_path(output_path), fingerprints, topic_counts)
+    # Una reconstrucción completa no deja delta que aplicar
+    for path in delta_paths(output_path):
+        if os.path.exists(path):
+            os.remove(path)
 
-    # Procesar cada paper
-    for idx, paper in enumerate(papers):
-        paper_uri = EX[f"paper{idx}"]
-        g.add((paper_uri, RDF.type, BIBO.Document))
-
-        # Título
-        if paper.get("title"):
-            g.add((paper_uri, DCTERMS.title, Literal(paper["title"])))
-
-        # DOI
-        if paper.get("doi"):
-            g.add((paper_uri, BIBO.doi, Literal(paper["doi"])))
-
-        # Fecha
-        if paper.get("publicationYear"):
-            g.add((paper_uri, DCTERMS.issued, Literal(paper["publicationYear"])))
-
-        # Revista
-        if paper.get("publishedIn"):
-            g.add((paper_uri, DCTERMS.publisher, Literal(paper["publishedIn"])))
-
-        # Autores
-        for i, author in enumerate(paper.get("authors", [])):
-            author_uri = EX[f"author_{idx}_{i}"]
-            full_name = " ".join(filter(None, [
-                author.get("firstname", "").strip(),
-                author.get("middlename", "").strip(),
-                author.get("lastname", "").strip()
-            ]))
-            g.add((author_uri, RDF.type, FOAF.Person))
-            g.add((author_uri, FOAF.name, Literal(full_name)))
-            g.add((paper_uri, DCTERMS.creator, author_uri))
-
-        # Temas desde OpenAlex (topics)
-        for topic in paper.get("openalex_topics", []):
-            topic_uri = URIRef(f"http://example.org/topic/{topic.replace(' ', '_')}")
-            g.add((topic_uri, RDF.type, SKOS.Concept))
-            g.add((topic_uri, SKOS.prefLabel, Literal(topic)))
-            g.add((paper_uri, DCTERMS.subject, topic_uri))
-
-    # Guardar RDF
-    g.serialize(output_path, format="turtle")
     print(f"✅ RDF enriquecido con topics guardado en '{output_path}'")
     return 0
@@ -1,48 +1,203 @@
-import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import requests
+from requests.adapters import HTTPAdapter
+from pipeline.papers_jsonl import read_papers, write_papers, export_json as export_json_file
+from enrich.response_cache import ResponseCache, MISSING
 
-def add_topics(file_path, output_path):
-    # Cargar datos desde el archivo original
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+# URL base de OpenAlex; se puede apuntar a un servidor local para pruebas
+OPENALEX_URL = os.environ.get("OPENALEX_URL", "https://api.openalex.org")
+# OpenAlex admite hasta 50 valores separados por '|' en un filtro
+OPENALEX_BATCH_SIZE = 50
+# Consultas por lotes en paralelo (OpenAlex limita a 10 peticiones/s)
+OPENALEX_CONCURRENCY = int(os.environ.get("OPENALEX_CONCURRENCY", 4))
+OPENALEX_MAX_RETRIES = 3
 
-    if data is None:
+# Caché persistente de topicos por DOI normalizado. Los topicos de un trabajo
+# casi nunca cambian, así que las entradas duran 30 días por defecto
+OPENALEX_CACHE_PATH = os.path.join("output", "openalex_cache.sqlite")
+OPENALEX_CACHE_TTL = float(os.environ.get("OPENALEX_CACHE_TTL_DAYS", 30)) * 24 * 3600
+OPENALEX_CACHE_MAX_ENTRIES = int(os.environ.get("OPENALEX_CACHE_MAX_ENTRIES", 1_000_000))
+
+DOI_PREFIXES = ("https://doi.org/", "http://doi.org/", "https://dx.doi.org/", "http://dx.doi.org/", "doi:")
+
+def normalize_doi(doi):
+    """
+    Normaliza un DOI para compararlo con los que devuelve OpenAlex.
+
+    Devuelve el DOI en minúsculas y sin prefijo de URL, o None si no parece
+    un DOI (por ejemplo un identificador arXiv).
+    """
+    if not doi:
+        return None
+    doi = doi.strip().lower()
+    for prefix in DOI_PREFIXES:
+        if doi.startswith(prefix):
+            doi = doi[len(prefix):]
+            break
+    return doi if doi.startswith("10.") else None
+
+def create_session(pool_size=OPENALEX_CONCURRENCY):
+    """Sesión HTTP compartida con un pool de ``pool_size`` conexiones."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    mailto = os.environ.get("OPENALEX_MAILTO")
+    if mailto:
+        # Identificarse da acceso al "polite pool" de OpenAlex
+        session.params = {"mailto": mailto}
+    return session
+
+def _get(session, url, params=None):
+    """GET con reintentos cuando OpenAlex responde 429 o 5xx."""
+    for attempt in range(OPENALEX_MAX_RETRIES + 1):
+        resp = session.get(url, params=params)
+        if resp.status_code != 429 and resp.status_code < 500:
+            return resp
+        if attempt < OPENALEX_MAX_RETRIES:
+            retry_after = resp.headers.get("Retry-After", "")
+            time.sleep(float(retry_after) if retry_after.isdigit() else 2 ** attempt)
+    return resp
+
+def get_openalex_topics(session, doi, base_url=OPENALEX_URL):
+    """
+    Dado un DOI, consulta OpenAlex y devuelve la lista de topicos relacionados.
+
+    Devuelve una lista vacía si OpenAlex no conoce el DOI, y None si la
+    consulta falló (un resultado que no debe guardarse en caché).
+    """
+    if not doi:
+        return []
+
+    url = f"{base_url}/works/https://doi.org/{doi}"
+    try:
+        resp = _get(session, url)
+        if resp.status_code == 200:
+            info = resp.json()
+            topics = info.get("topics", [])
+            return [t["display_name"] for t in topics]
+        else:
+            print(f"❌ Error {resp.status_code} para DOI {doi}")
+            return [] if resp.status_code == 404 else None
+    except Exception as e:
+        print(f"⚠️ Excepción para DOI {doi}: {e}")
+        return None
+
+def get_openalex_topics_batch(session, dois, base_url=OPENALEX_URL):
+    """
+    Consulta los topicos de varios DOIs normalizados con una sola petición.
+
+    Usa el filtro ``doi:a|b|c`` de OpenAlex y ``select`` para recibir solo
+    el DOI y los topicos de cada trabajo. Devuelve {doi: [topicos]}; los DOIs
+    que OpenAlex no conoce tienen una lista vacía. Si la consulta falla
+    devuelve un diccionario vacío.
+    """
+    topics = {doi: [] for doi in dois}
+    params = {
+        "filter": "doi:" + "|".join(dois),
+        "select": "doi,topics",
+        "per-page": 200,
+    }
+    try:
+        resp = _get(session, f"{base_url}/works", params)
+        if resp.status_code != 200:
+            print(f"❌ Error {resp.status_code} para un lote de {len(dois)} DOIs")
+            return {}
+        for work in resp.json().get("results", []):
+            doi = normalize_doi(work.get("doi"))
+            if doi in topics:
+                topics[doi] = [t["display_name"] for t in work.get("topics") or []]
+    except Exception as e:
+        print(f"⚠️ Excepción para un lote de {len(dois)} DOIs: {e}")
+        return {}
+    return topics
+
+def add_topics(file_path, output_path, export_json=False, batch_size=OPENALEX_BATCH_SIZE,
+               concurrency=OPENALEX_CONCURRENCY, base_url=OPENALEX_URL, cache_path=OPENALEX_CACHE_PATH):
+    """
+    Añade a cada paper los topicos de OpenAlex de su DOI.
+
+    Los DOIs se agrupan en consultas de ``batch_size`` DOIs, y se lanzan
+    ``concurrency`` consultas a la vez sobre una sesión compartida. Con
+    ``batch_size=1`` se hace una petición por DOI.
+
+    Las respuestas, incluidas las de DOIs que OpenAlex no conoce, se guardan
+    en la caché SQLite ``cache_path`` y solo se consultan los DOIs que no
+    están en ella o han caducado. ``cache_path=None`` desactiva la caché.
+    """
+    # Los papers se leen y se escriben por bloques (JSON Lines)
+    if not os.path.exists(file_path):
         print(f"❌ Error: can't open file {file_path}")
         return 1
 
-    papers = data["papers"]
-
-    def get_openalex_topics(doi):
-        """
-        Dado un DOI, consulta OpenAlex y devuelve la lista de topicos relacionados.
-        """
-        if not doi:
-            return []
-        
-        url = f"https://api.openalex.org/works/https://doi.org/{doi}"
-        try:
-            resp = requests.get(url)
-            if resp.status_code == 200:
-                info = resp.json()
-                topics = info.get("topics", [])
-                return [t["display_name"] for t in topics]
-            else:
-                print(f"❌ Error {resp.status_code} para DOI {doi}")
-                return []
-        except Exception as e:
-            print(f"⚠️ Excepción para DOI {doi}: {e}")
-            return []
+    session = create_session(concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    cache = ResponseCache(cache_path, OPENALEX_CACHE_TTL, OPENALEX_CACHE_MAX_ENTRIES) if cache_path else None
+    requests_sent = 0
+
+    def fetch(dois):
+        """Consulta OpenAlex; devuelve {doi: topicos} de las consultas que no fallaron."""
+        nonlocal requests_sent
+        if batch_size == 1:
+            requests_sent += len(dois)
+            results = executor.map(lambda doi: get_openalex_topics(session, doi, base_url), dois)
+            return {doi: topics for doi, topics in zip(dois, results) if topics is not None}
+        batches = [dois[i:i + batch_size] for i in range(0, len(dois), batch_size)]
+        requests_sent += len(batches)
+        topics = {}
+        for result in executor.map(lambda batch: get_openalex_topics_batch(session, batch, base_url), batches):
+            topics.update(result)
+        return topics
+
+    def lookup(chunk):
+        """Devuelve {doi normalizado: topicos} para los papers de ``chunk``."""
+        dois = list(dict.fromkeys(filter(None, (normalize_doi(p.get("doi")) for p in chunk))))
+        if cache is None:
+            return fetch(dois)
+
+        topics = {}
+        for doi in dois:
+            cached = cache.get(doi)
+            if cached is not MISSING:
+                topics[doi] = cached
+        fetched = fetch([doi for doi in dois if doi not in topics])
+        for doi, doi_topics in fetched.items():
+            cache.put(doi, doi_topics, negative=not doi_topics)
+        cache.commit()
+        topics.update(fetched)
+        return topics
 
     # Obtener temas para cada artículo
-    for paper in papers:
-        doi = paper.get("doi")
-        topics = get_openalex_topics(doi)
-        paper["openalex_topics"] = topics
-        print(f"{paper['title'][:60]}... → {topics}")
+    def enriched_papers():
+        papers = read_papers(file_path)
+        while True:
+            chunk = list(islice(papers, batch_size * concurrency))
+            if not chunk:
+                break
+            topics_by_doi = lookup(chunk)
+            for paper in chunk:
+                topics = topics_by_doi.get(normalize_doi(paper.get("doi")), [])
+                paper["openalex_topics"] = topics
+                print(f"{paper['title'][:60]}... → {topics}")
+                yield paper
+
+    # Guardar los resultados enriquecidos según se obtienen
+    with session, executor:
+        write_papers(output_path, enriched_papers())
+
+    if cache is not None:
+        cache.evict()
+        stats = cache.stats()
+        cache.close()
+        print(f"ℹ️ Caché de OpenAlex: {stats['hits']} aciertos, {stats['misses']} fallos, "
+              f"{requests_sent} peticiones a OpenAlex")
 
-    # Guardar los resultados enriquecidos
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    # Exportar opcionalmente al formato JSON anterior
+    if export_json:
+        export_json_file(output_path, os.path.splitext(output_path)[0] + ".json")
 
     print(f"✅ Temas agregados y guardados en '{output_path}'")
-    return 0
\ No newline at end of file
+    return 0
@@ -0,0 +1,97 @@
+import json
+import os
+import sqlite3
+import time
+
+# Returned by ResponseCache.get() when there is no fresh entry for a key
+MISSING = object()
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of API responses.
+
+    Each entry stores a JSON payload, whether it is a negative result (e.g.
+    a 404 or an empty search) and when it was fetched. Entries older than
+    ``ttl`` seconds (``negative_ttl`` for negative results, ``ttl`` if not
+    given) are treated as missing, and evict() keeps at most
+    ``max_entries`` rows, dropping the least recently used first.
+    """
+
+    def __init__(self, path, ttl, max_entries, negative_ttl=None):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                negative INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self.conn.commit()
+
+    def get(self, key):
+        """Return the cached payload of ``key``, or MISSING if absent or expired."""
+        row = self.conn.execute(
+            "SELECT payload, negative, fetched_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or now - row[2] > (self.negative_ttl if row[1] else self.ttl):
+            self.misses += 1
+            return MISSING
+        self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, payload, negative=False):
+        """Store ``payload`` for ``key``; ``negative`` marks a "not found" result."""
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (key, json.dumps(payload, ensure_ascii=False), int(negative), now, now)
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones beyond max_entries."""
+        now = time.time()
+        self.conn.execute(
+            "DELETE FROM responses WHERE fetched_at < CASE negative WHEN 0 THEN ? ELSE ? END",
+            (now - self.ttl, now - self.negative_ttl)
+        )
+        self.conn.execute("""
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        self.conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters of this session and the number of entries."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0],
+        }
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,96 +1,371 @@
-from time import sleep
+import argparse
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from rdflib import Graph, URIRef, Namespace
 from rdflib.namespace import OWL
+from rdflib.util import guess_format
+from rdflib.plugins.parsers.ntriples import unquote
 import requests
+from requests.adapters import HTTPAdapter
+from enrich.response_cache import ResponseCache, MISSING
 
-def query_wikidata(search_term, entity_type=None):
+WIKIDATA_API_URL = "https://www.wikidata.org/w/api.php"
+WIKIDATA_ENTITY_PREFIX = "http://www.wikidata.org/entity/"
+SKOS_PREF_LABEL = URIRef("http://www.w3.org/2004/02/skos/core#prefLabel")
+FOAF_NAME = URIRef("http://xmlns.com/foaf/0.1/name")
+
+# Label triples of an N-Triples file: subject, predicate and literal value
+_LABEL_LINE = re.compile(
+    r'^(\S+)\s+<(%s|%s)>\s+"(.*)"(?:@[A-Za-z0-9-]+|\^\^<[^>]*>)?\s*\.\s*$'
+    % (re.escape(str(SKOS_PREF_LABEL)), re.escape(str(FOAF_NAME)))
+)
+
+# Wikimedia asks API clients to identify themselves and to keep a modest,
+# steady request rate: at most a few concurrent requests, backing off when
+# the API answers 429 or reports lag through Retry-After.
+WIKIDATA_USER_AGENT = os.environ.get(
+    "WIKIDATA_USER_AGENT",
+    "data-analysis/1.0 (https://github.com/marcupm/data-analysis)"
+)
+WIKIDATA_RATE = float(os.environ.get("WIKIDATA_RATE", 5))   # requests per second
+WIKIDATA_BURST = int(os.environ.get("WIKIDATA_BURST", 5))
+WIKIDATA_CONCURRENCY = int(os.environ.get("WIKIDATA_CONCURRENCY", 4))
+WIKIDATA_MAX_RETRIES = 5
+WIKIDATA_LANGUAGE = "en"
+
+# Persistent label -> entity cache. Matches are kept much longer than
+# "no match" results, which become stale as Wikidata grows.
+WIKIDATA_CACHE_PATH = os.path.join("output", "wikidata_cache.sqlite")
+WIKIDATA_CACHE_TTL = float(os.environ.get("WIKIDATA_CACHE_TTL_DAYS", 90)) * 24 * 3600
+WIKIDATA_CACHE_NEGATIVE_TTL = float(os.environ.get("WIKIDATA_CACHE_NEGATIVE_TTL_DAYS", 7)) * 24 * 3600
+WIKIDATA_CACHE_MAX_ENTRIES = int(os.environ.get("WIKIDATA_CACHE_MAX_ENTRIES", 1_000_000))
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Tokens are refilled at ``rate`` per second up to ``capacity``; acquire()
+    blocks until one is available. pause() stops handing out tokens for a
+    while, so every thread backs off when the server asks one of them to.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.paused_until:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.paused_until - now
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+            self.updated = self.paused_until
+
+def create_session(pool_size=WIKIDATA_CONCURRENCY):
+    """Create a session with a connection pool shared by all Wikidata requests."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = WIKIDATA_USER_AGENT
+    return session
+
+# Shared by every call to query_wikidata
+_session = create_session()
+_rate_limiter = TokenBucket(WIKIDATA_RATE, WIKIDATA_BURST)
+
+def _retry_after(response, attempt):
+    """Seconds to wait before retrying, from Retry-After or exponential backoff."""
+    value = response.headers.get("Retry-After", "")
+    try:
+        return max(float(value), 1.0)
+    except ValueError:
+        return 2.0 ** attempt
+
+def open_cache(path=WIKIDATA_CACHE_PATH):
+    """Open the persistent Wikidata resolution cache."""
+    return ResponseCache(path, WIKIDATA_CACHE_TTL, WIKIDATA_CACHE_MAX_ENTRIES,
+                         negative_ttl=WIKIDATA_CACHE_NEGATIVE_TTL)
+
+def cache_key(search_term, entity_type=None, language=WIKIDATA_LANGUAGE):
+    """Key of a search in the resolution cache: (search term, language, type)."""
+    return "\x1f".join([search_term, language, entity_type or ""])
+
+def search_wikidata(search_term, entity_type=None, session=None, rate_limiter=None):
     """
     Query Wikidata for entities matching the search term.
-    
+
+    Same as query_wikidata, but raises an exception when the request fails
+    instead of returning None, so failures are not mistaken for "no match".
+
     Args:
         search_term: The term to search for
         entity_type: Optional Wikidata entity type to filter results
-        
+        session: requests session to use (defaults to the shared one)
+        rate_limiter: TokenBucket to use (defaults to the shared one)
+
     Returns:
         Dictionary with Wikidata ID and label if found, None otherwise
     """
     if not search_term or len(search_term) < 3:
         return None
-        
-    url = "https://www.wikidata.org/w/api.php"
-    
+
+    session = session or _session
+    rate_limiter = rate_limiter or _rate_limiter
+
     params = {
         "action": "wbsearchentities",
         "format": "json",
-        "language": "en",
+        "language": WIKIDATA_LANGUAGE,
         "search": search_term
     }
-    
+
     # Add type filter if specified
     if entity_type:
         params["type"] = entity_type
-    
+
+    for attempt in range(WIKIDATA_MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        response = session.get(WIKIDATA_API_URL, params=params)
+        if response.status_code not in (429, 503) or attempt == WIKIDATA_MAX_RETRIES:
+            break
+        # Too many requests or server lag: every worker waits
+        rate_limiter.pause(_retry_after(response, attempt))
+
+    response.raise_for_status()
+    data = response.json()
+    if "error" in data:
+        raise RuntimeError(data["error"].get("info", data["error"]))
+
+    if "search" in data and len(data["search"]) > 0:
+        item = data["search"][0]
+        return {
+            "id": item["id"],
+            "uri": f"http://www.wikidata.org/entity/{item['id']}",
+            "label": item.get("label", search_term)
+        }
+    return None
+
+def query_wikidata(search_term, entity_type=None, session=None, rate_limiter=None):
+    """
+    Query Wikidata for entities matching the search term.
+
+    Args:
+        search_term: The term to search for
+        entity_type: Optional Wikidata entity type to filter results
+        session: requests session to use (defaults to the shared one)
+        rate_limiter: TokenBucket to use (defaults to the shared one)
+
+    Returns:
+        Dictionary with Wikidata ID and label if found, None otherwise
+    """
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if "search" in data and len(data["search"]) > 0:
-            item = data["search"][0]
-            return {
-                "id": item["id"],
-                "uri": f"http://www.wikidata.org/entity/{item['id']}",
-                "label": item.get("label", search_term)
-            }
-        return None
+        return search_wikidata(search_term, entity_type, session, rate_limiter)
     except Exception as e:
         print(f"Error querying Wikidata for {search_term}: {e}")
         return None
-    finally:
-        # Be nice to the Wikidata API
-        sleep(0.1)
-
-def enrich_rdf_with_wikidata(input_file, output_file):
-    """Enrich existing RDF graph with Wikidata links"""
-    
-    # Load the existing graph
+
+def query_wikidata_many(search_terms, entity_type=None, concurrency=WIKIDATA_CONCURRENCY, cache=None):
+    """
+    Query Wikidata for many search terms concurrently.
+
+    Repeated terms are sent only once, and with a ResponseCache only terms
+    without a fresh cached result hit the network. Returns a dict {search
+    term: entity or None}.
+    """
+    entities = {}
+    pending = []
+    for term in dict.fromkeys(search_terms):
+        cached = cache.get(cache_key(term, entity_type)) if cache is not None else MISSING
+        if cached is MISSING:
+            pending.append(term)
+        else:
+            entities[term] = cached
+
+    def lookup(term):
+        try:
+            return True, search_wikidata(term, entity_type)
+        except Exception as e:
+            print(f"Error querying Wikidata for {term}: {e}")
+            return False, None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for term, (ok, entity) in zip(pending, executor.map(lookup, pending)):
+            entities[term] = entity
+            # Short terms are never sent and failed requests are retried next run
+            if cache is not None and ok and len(term) >= 3:
+                cache.put(cache_key(term, entity_type), entity, negative=entity is None)
+
+    if cache is not None:
+        cache.commit()
+    return entities
+
+def iter_labels(rdf_file):
+    """
+    Iterate over the topic labels and author names of an RDF file.
+
+    Yields (subject, predicate, label) with the subject in N-Triples syntax.
+    N-Triples files are scanned line by line without building a graph; other
+    formats are parsed with rdflib.
+    """
+    fmt = guess_format(rdf_file) or "turtle"
+    if fmt == "nt":
+        with open(rdf_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if str(SKOS_PREF_LABEL) not in line and str(FOAF_NAME) not in line:
+                    continue
+                match = _LABEL_LINE.match(line)
+                if match:
+                    yield match.group(1), URIRef(match.group(2)), unquote(match.group(3))
+        return
+
     g = Graph()
-    g.parse(input_file, format="turtle")
-    if len(g) == 0:
-        print("❌ Error there are no paper to enrich")
+    g.parse(rdf_file, format=fmt)
+    for predicate in (SKOS_PREF_LABEL, FOAF_NAME):
+        for s, _, o in g.triples((None, predicate, None)):
+            yield s.n3(), predicate, str(o)
+
+def iter_same_as(rdf_file):
+    """Iterate over the (subject, Wikidata URI) owl:sameAs links of an RDF file."""
+    g = Graph()
+    g.parse(rdf_file, format=guess_format(rdf_file) or "turtle")
+    for s, _, o in g.triples((None, OWL.sameAs, None)):
+        if str(o).startswith(WIKIDATA_ENTITY_PREFIX):
+            yield s.n3(), str(o)
+
+def warm_cache_from_graph(rdf_files, cache):
+    """
+    Pre-warm the resolution cache from an already enriched graph.
+
+    ``rdf_files`` are read together, e.g. the base graph and its sameAs
+    delta, or a single published Turtle file. Every topic label and author
+    name linked with owl:sameAs to a Wikidata entity is stored as a match;
+    labels without a link as "no match". Returns the number of cached labels.
+    """
+    links = {}
+    for rdf_file in rdf_files:
+        links.update(iter_same_as(rdf_file))
+
+    count = 0
+    for rdf_file in rdf_files:
+        for subject, _, label in iter_labels(rdf_file):
+            if len(label) < 3:
+                continue
+            uri = links.get(subject)
+            entity = None
+            if uri:
+                entity = {"id": uri[len(WIKIDATA_ENTITY_PREFIX):], "uri": uri, "label": label}
+            cache.put(cache_key(label, "item"), entity, negative=entity is None)
+            count += 1
+    cache.commit()
+    return count
+
+def enrich_rdf_with_wikidata(input_file, output_file, cache_path=WIKIDATA_CACHE_PATH):
+    """
+    Link the topics and authors of an RDF graph to Wikidata.
+
+    Only the skos:prefLabel and foaf:name triples of ``input_file`` are read
+    (streamed from N-Triples), and only the new owl:sameAs triples are
+    written to ``output_file`` as an N-Triples delta; the API combines it
+    with the base graph when loading. Labels are resolved through the
+    persistent cache in ``cache_path`` (None disables it), so only labels
+    never seen before hit the network.
+    """
+    if not os.path.exists(input_file):
+        print(f"❌ Error: can't open file {input_file}")
         return 1
-    
-    # Add owl:sameAs predicates
-    
-    WD = Namespace("http://www.wikidata.org/entity/")
-    g.bind("wd", WD)
-    
-    # Find all topics
+
+    # Find all topics and authors
     topics = {}
-    for s, _, o in g.triples((None, URIRef("http://www.w3.org/2004/02/skos/core#prefLabel"), None)):
-        topic_name = str(o)
-        topics[s] = topic_name
-    
-    # Enrich topics with Wikidata links
-    for topic_uri, topic_name in topics.items():
-        wikidata_entity = query_wikidata(topic_name, "item")
-        if wikidata_entity:
-            g.add((topic_uri, OWL.sameAs, URIRef(wikidata_entity["uri"])))
-            print(f"Linked topic '{topic_name}' to {wikidata_entity['uri']}")
-    
-    # Find all authors
     authors = {}
-    for s, _, o in g.triples((None, URIRef("http://xmlns.com/foaf/0.1/name"), None)):
-        author_name = str(o)
-        authors[s] = author_name
-    
-    # Enrich authors with Wikidata links
-    for author_uri, author_name in authors.items():
-        wikidata_entity = query_wikidata(author_name, "item")
-        if wikidata_entity:
-            g.add((author_uri, OWL.sameAs, URIRef(wikidata_entity["uri"])))
-            print(f"Linked author '{author_name}' to {wikidata_entity['uri']}")
-    
-    # Save the enriched graph
+    for subject, predicate, label in iter_labels(input_file):
+        if predicate == SKOS_PREF_LABEL:
+            topics[subject] = label
+        else:
+            authors[subject] = label
+
+    if not topics and not authors:
+        print("❌ Error there are no paper to enrich")
+        return 1
+
+    # Look up every distinct label once, topics and authors together
+    cache = open_cache(cache_path) if cache_path else None
+    entities = query_wikidata_many(list(topics.values()) + list(authors.values()), "item", cache=cache)
+    if cache is not None:
+        cache.evict()
+        stats = cache.stats()
+        cache.close()
+        print(f"Wikidata cache: {stats['hits']} hits, {stats['misses']} misses")
+
+    same_as = URIRef(OWL.sameAs).n3()
+    tmp_path = output_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        # Enrich topics with Wikidata links
+        for topic_uri, topic_name in topics.items():
+            wikidata_entity = entities[topic_name]
+            if wikidata_entity:
+                f.write(f"{topic_uri} {same_as} <{wikidata_entity['uri']}> .\n")
+                print(f"Linked topic '{topic_name}' to {wikidata_entity['uri']}")
+
+        # Enrich authors with Wikidata links
+        for author_uri, author_name in authors.items():
+            wikidata_entity = entities[author_name]
+            if wikidata_entity:
+                f.write(f"{author_uri} {same_as} <{wikidata_entity['uri']}> .\n")
+                print(f"Linked author '{author_name}' to {wikidata_entity['uri']}")
+    os.replace(tmp_path, output_file)
+
+    print(f"✅ Wikidata links saved to {output_file}")
+    return 0
+
+def publish_turtle(rdf_files, output_file):
+    """Merge the base graph and its deltas into one Turtle file for publishing."""
+    g = Graph()
+    for rdf_file in rdf_files:
+        if not os.path.exists(rdf_file):
+            print(f"❌ Error: can't open file {rdf_file}")
+            return 1
+        g.parse(rdf_file, format=guess_format(rdf_file) or "turtle")
+
+    g.bind("dcterms", "http://purl.org/dc/terms/")
+    g.bind("foaf", "http://xmlns.com/foaf/0.1/")
+    g.bind("bibo", "http://purl.org/ontology/bibo/")
+    g.bind("skos", "http://www.w3.org/2004/02/skos/core#")
+    g.bind("ex", "http://example.org/resource/")
+    g.bind("wd", Namespace(WIKIDATA_ENTITY_PREFIX))
     g.serialize(output_file, format="turtle")
     print(f"✅ Enriched RDF saved to {output_file}")
-    return 0
\ No newline at end of file
+    return 0
+
+if __name__ == "__main__":
+    # Run from the app folder:
+    #   python -m enrich.wikidata_enrich warm-cache output/papers_with_topics.nt output/papers_wikidata_sameas.nt
+    parser = argparse.ArgumentParser(description="Wikidata resolution cache tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    warm = subparsers.add_parser("warm-cache", help="pre-warm the cache from an enriched graph")
+    warm.add_argument("rdf_files", nargs="+", help="RDF files read together, e.g. base graph and sameAs delta")
+    warm.add_argument("--cache", default=WIKIDATA_CACHE_PATH)
+    args = parser.parse_args()
+
+    with open_cache(args.cache) as cache:
+        count = warm_cache_from_graph(args.rdf_files, cache)
+    print(f"✅ Cached {count} labels from {', '.join(args.rdf_files)} in {args.cache}")
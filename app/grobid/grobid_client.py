@@ -1,14 +1,33 @@
 import requests
 import os
 import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from grobid.tei_cache import TeiCache, TEI_CACHE_DIR, cache_key, file_sha256
+from grobid.tei_store import TeiStore, TEI_STORE_DIR
 
 GROBID_URL_DOCKER = "http://grobid:8070/api/"
 GROBID_URL_LOCALHOST = "http://localhost:8070/api/"
 
+# Number of PDFs in flight at once. It should match the size of GROBID's own
+# worker pool (``concurrency`` in grobid.yaml, 10 by default): more requests
+# than that only queue inside GROBID or get rejected with 503.
+GROBID_CONCURRENCY = int(os.environ.get("GROBID_CONCURRENCY", 10))
+
+# GROBID answers 503 when all its workers are busy; retry those a few times.
+GROBID_MAX_RETRIES = 5
+GROBID_RETRY_BACKOFF = 2.0
+
+# Options sent with every processFulltextDocument request. They are part of
+# the TEI cache key, so changing them invalidates cached documents.
+GROBID_OPTIONS = {"consolidateHeader": 1}
+
 def check_grobid_availability():
     """Check if GROBID is available at the provided URL."""
     urls = [GROBID_URL_DOCKER, GROBID_URL_LOCALHOST]
-    
+
     for url in urls:
         url_is_alive = url + 'isalive'
         try:
@@ -20,35 +39,165 @@ def check_grobid_availability():
                 logging.error(f"GROBID not available at {url}, Status code: {response.status_code}")
         except requests.exceptions.RequestException as e:
             logging.error(f"Error connecting to GROBID at {url}: {e}")
-    
+
     return None  # Return None if no URL is available
 
-def process_papers(pdf_folder):
-    """Send PDFs to GROBID for processing and return the extracted text."""
-    processed_papers = {}
-    
+def get_grobid_version(grobid_url):
+    """Return the version string reported by GROBID, or "unknown"."""
+    try:
+        response = requests.get(grobid_url + "version")
+        if response.status_code == 200:
+            return response.text.strip()
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error getting GROBID version: {e}")
+    return "unknown"
+
+def create_session(pool_size):
+    """Create a requests session whose connection pool holds ``pool_size`` connections."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def submit_pdf(session, grobid_url, filepath):
+    """
+    Post one PDF to GROBID.
+
+    Returns a tuple (tei_text or None, elapsed seconds).
+    """
+    start = time.perf_counter()
+    for attempt in range(GROBID_MAX_RETRIES + 1):
+        try:
+            with open(filepath, "rb") as pdf:
+                response = session.post(
+                    grobid_url,
+                    files={"input": pdf},
+                    data=GROBID_OPTIONS
+                )
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Processing error: {os.path.basename(filepath)}: {e}")
+            return None, time.perf_counter() - start
+
+        if response.status_code == 503 and attempt < GROBID_MAX_RETRIES:
+            # GROBID pool exhausted, wait and try again
+            time.sleep(GROBID_RETRY_BACKOFF * (attempt + 1))
+            continue
+        break
+
+    elapsed = time.perf_counter() - start
+    if response.status_code == 200:
+        return response.text, elapsed
+
+    logging.error(f"Processing error: {os.path.basename(filepath)} (status {response.status_code})")
+    return None, elapsed
+
+def log_throughput(latencies, total_time):
+    """Log per-file latency statistics and overall throughput of a GROBID run."""
+    if not latencies:
+        return
+    ordered = sorted(latencies)
+    p50 = ordered[len(ordered) // 2]
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    logging.info(
+        f"GROBID processed {len(latencies)} PDFs in {total_time:.1f}s "
+        f"({len(latencies) / total_time:.2f} PDFs/s) - latency p50 {p50:.2f}s, "
+        f"p95 {p95:.2f}s, max {ordered[-1]:.2f}s"
+    )
+
+def iter_processed_papers(pdf_folder, grobid_url, store, concurrency=GROBID_CONCURRENCY,
+                          cache=None, grobid_version=None, stats=None):
+    """
+    Stream PDFs through GROBID, spooling every TEI document into ``store``.
+
+    Workers write each TEI to its own file as soon as it arrives, and at most
+    ``2 * concurrency`` documents are pending at any time, so memory use does
+    not grow with the corpus. Yields the names of the stored PDFs in
+    filename order.
+    """
+    filenames = sorted(f for f in os.listdir(pdf_folder) if f.endswith(".pdf"))
+    concurrency = max(1, concurrency)
+    latencies = stats if stats is not None else []
+
+    def process(filename):
+        filepath = os.path.join(pdf_folder, filename)
+        key = None
+        if cache is not None:
+            key = cache_key(file_sha256(filepath), grobid_version, GROBID_OPTIONS)
+            tei = cache.get(key)
+            if tei is not None:
+                store.write(filename, tei)
+                return True, None
+
+        logging.info(f"Processing: {filename}")
+        tei, elapsed = submit_pdf(session, grobid_url, filepath)
+        if tei is None:
+            store.remove(filename)
+            return False, elapsed
+        if cache is not None:
+            cache.put(key, tei)
+        store.write(filename, tei)
+        return True, elapsed
+
+    session = create_session(concurrency)
+    with session, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = deque()
+        for filename in filenames:
+            pending.append((filename, executor.submit(process, filename)))
+            # Consume in submission order, so the output is deterministic
+            yield from _drain(pending, latencies, keep=2 * concurrency - 1)
+        yield from _drain(pending, latencies, keep=0)
+
+def _drain(pending, latencies, keep):
+    """Yield the stored filenames of ``pending`` futures until ``keep`` remain."""
+    while len(pending) > keep:
+        filename, future = pending.popleft()
+        stored, elapsed = future.result()
+        if elapsed is None:
+            logging.info(f"Cached: {filename}")
+        else:
+            latencies.append(elapsed)
+            logging.info(f"Processed: {filename} in {elapsed:.2f}s")
+        if stored:
+            yield filename
+
+def process_papers(pdf_folder, concurrency=GROBID_CONCURRENCY, cache_dir=TEI_CACHE_DIR,
+                   store_dir=TEI_STORE_DIR):
+    """
+    Send PDFs to GROBID for processing and return the extracted text.
+
+    Up to ``concurrency`` PDFs are submitted at the same time over a shared
+    pooled session. Every TEI document is written to its own file in
+    ``store_dir`` as it arrives, and the returned TeiStore reads them back
+    lazily, ordered by filename.
+
+    PDFs whose content, GROBID version and options match an entry of the
+    TEI cache in ``cache_dir`` are not sent again. Pass ``cache_dir=None``
+    to disable the cache.
+    """
     availability = check_grobid_availability()
     if availability is None:
         print("❌ Error: grobid not avaliable")
         return 1
-    
+
     grobid_url = availability + "processFulltextDocument"
 
-    for filename in os.listdir(pdf_folder):
-        if filename.endswith(".pdf"):
-            filepath = os.path.join(pdf_folder, filename)
-            logging.info(f"Processing: {filename}")
+    store = TeiStore(store_dir)
+    cache = TeiCache(cache_dir) if cache_dir else None
+    grobid_version = get_grobid_version(availability) if cache else None
 
-            with open(filepath, "rb") as pdf:
-                response = requests.post(
-                    grobid_url, 
-                    files={"input": pdf}, 
-                    data={"consolidateHeader": 1}
-                )
-                
-                if response.status_code == 200:
-                    processed_papers[filename] = response.text
-                else:
-                    logging.error(f"Processing error: {filename}")
+    latencies = []
+    start = time.perf_counter()
+    stored = set(iter_processed_papers(pdf_folder, grobid_url, store, concurrency,
+                                       cache, grobid_version, latencies))
+
+    # Drop documents of PDFs that are no longer in the folder
+    for filename in list(store):
+        if filename not in stored:
+            store.remove(filename)
 
-    return processed_papers
+    log_throughput(latencies, time.perf_counter() - start)
+    if cache is not None:
+        logging.info(f"TEI cache: {cache.hits} hits, {cache.misses} PDFs sent to GROBID")
+        cache.evict()
+    return store
@@ -1,155 +1,325 @@
 import os
-import json
 import xml.etree.ElementTree as ET
+from xml.parsers import expat
 import re
 import logging
 import csv  # Importar el módulo CSV
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pipeline.papers_jsonl import read_papers, write_papers, export_json as export_json_file
 
-def extract_metadata_from_grobid_output(processed_papers, output_folder, output_filename):
+NS = {'tei': 'http://www.tei-c.org/ns/1.0'}
+TEI_HEADER = '{http://www.tei-c.org/ns/1.0}teiHeader'
+TEI_HEADER_END = '</teiHeader>'
+
+# Rutas de búsqueda, definidas una vez. Se buscan primero dentro de teiHeader
+# (ver TeiDocument). El segundo elemento indica si la ruta solo puede
+# aparecer en la cabecera
+TITLE_PATHS = (
+    ('.//tei:titleStmt/tei:title', True),
+    ('.//tei:analytic/tei:title[@level="a"][@type="main"]', False),
+    ('.//tei:analytic/tei:title', False),
+)
+DATE_PATHS = (
+    ('.//tei:publicationStmt/tei:date[@type="published"]', True),
+    ('.//tei:imprint/tei:date[@type="published"]', False),
+)
+VENUE_PATHS = (
+    './/tei:monogr/tei:title[@level="j"][@type="main"]',
+    './/tei:monogr/tei:title[@level="j"]',
+    './/tei:monogr/tei:meeting',
+)
+DOI_PATH = './/tei:idno[@type="DOI"]'
+ARXIV_PATH = './/tei:idno[@type="arXiv"]'
+ABSTRACT_P_PATH = './/tei:profileDesc/tei:abstract/tei:p'
+ABSTRACT_DIV_P_PATH = './/tei:profileDesc/tei:abstract/tei:div/tei:p'
+ABSTRACT_PATH = './/tei:profileDesc/tei:abstract'
+BODY_P_PATH = './/tei:body//tei:p'
+AUTHOR_PATH = './/tei:sourceDesc/tei:biblStruct/tei:analytic/tei:author'
+YEAR_RE = re.compile(r'(19|20)\d{2}')
+
+# Número de documentos enviados a la vez al pool de procesos
+CHUNK_SIZE = 64
+
+class TeiDocument:
+    """
+    Documento TEI analizado en una sola pasada sobre su cabecera.
+
+    Casi todos los metadatos están en teiHeader, que es el primer hijo del
+    documento y ocupa una pequeña parte del XML. Solo se construye ese
+    subárbol; el árbol completo (cuerpo y bibliografía) se construye bajo
+    demanda si alguna ruta no tiene coincidencia en la cabecera. Como
+    teiHeader va primero, una coincidencia dentro de él es siempre la primera
+    del documento, y los resultados son los mismos que buscando en el árbol
+    completo.
+    """
+
+    def __init__(self, xml_text):
+        self.xml_text = xml_text
+        self.root = None
+        self.header = self._parse_header(xml_text)
+        if self.header is None:
+            self.root = ET.fromstring(xml_text)
+
+    @staticmethod
+    def _parse_header(xml_text):
+        end = xml_text.find(TEI_HEADER_END)
+        if end == -1:
+            return None
+        parser = ET.XMLPullParser(events=("start", "end"))
+        parser.feed(xml_text[:end + len(TEI_HEADER_END)])
+        depth = 0
+        first_child = None
+        for event, elem in parser.read_events():
+            if event == "start":
+                depth += 1
+                if depth == 2 and first_child is None:
+                    first_child = elem
+            else:
+                depth -= 1
+                if elem is first_child:
+                    return elem if elem.tag == TEI_HEADER else None
+        return None
+
+    def check_well_formed(self):
+        """
+        Lanza una excepción si el documento completo no está bien formado.
+
+        Si el árbol completo no llegó a construirse, se comprueba con expat
+        sin crear ningún elemento.
+        """
+        if self.root is None:
+            expat.ParserCreate().Parse(self.xml_text, True)
+
+    def full(self):
+        """Devuelve la raíz del árbol completo, construyéndolo si hace falta."""
+        if self.root is None:
+            self.root = ET.fromstring(self.xml_text)
+        return self.root
+
+    def find(self, path, header_only=False):
+        """
+        Primer elemento que cumple ``path`` en orden de documento.
+
+        Con ``header_only`` no se busca fuera de teiHeader: el esquema TEI
+        solo permite titleStmt, publicationStmt, sourceDesc y profileDesc
+        dentro de la cabecera.
+        """
+        if self.header is not None:
+            elem = self.header.find(path, NS)
+            if elem is not None or header_only:
+                return elem
+        return self.full().find(path, NS)
+
+    def findtext(self, path, header_only=False):
+        """Equivalente a ``root.findtext(path)``."""
+        elem = self.find(path, header_only)
+        if elem is None:
+            return None
+        return elem.text or ""
+
+    def findall_header(self, path):
+        """Equivalente a ``root.findall(path)`` para rutas que solo existen en teiHeader."""
+        if self.header is not None:
+            return self.header.findall(path, NS)
+        return self.full().findall(path, NS)
+
+def _year(date_elem):
+    if date_elem is None:
+        return ""
+    match = YEAR_RE.search(date_elem.attrib.get('when', ''))
+    return match.group(0) if match else ""
+
+def extract_paper_metadata(filename, xml_text):
+    """
+    Extrae los metadatos de un documento TEI.
+
+    Devuelve una tupla (filename, paper_data o None, avisos, error) para que
+    el proceso principal escriba los mensajes de log en orden.
+    """
+    warnings = []
+    try:
+        # Limpieza básica de XML mal formado
+        xml_text = xml_text.replace("&", "&amp;").replace("<abstract></abstract>", "<abstract/>")
+
+        doc = TeiDocument(xml_text)
+
+        # Extracción de título
+        title = ""
+        for path, header_only in TITLE_PATHS:
+            title = doc.findtext(path, header_only)
+            if title:
+                break
+        if not title:
+            # La ruta original de último recurso (un predicado contains() que
+            # ElementTree no soporta) descartaba el paper
+            raise ValueError("no se encontró título")
+
+        # Extracción de año de publicación
+        publicationYear = ""
+        for path, header_only in DATE_PATHS:
+            publicationYear = _year(doc.find(path, header_only))
+            if publicationYear:
+                break
+
+        # Extracción de revista/conferencia
+        publishedIn = ""
+        for path in VENUE_PATHS:
+            publishedIn = doc.findtext(path)
+            if publishedIn:
+                break
+        publishedIn = publishedIn or ""
+
+        # Extracción de DOI o identificador alternativo
+        doi = doc.findtext(DOI_PATH) or ""
+
+        if not doi:
+            arxiv_id = doc.findtext(ARXIV_PATH)
+            if arxiv_id:
+                doi = f"arXiv:{arxiv_id}"
+
+        # Extracción de abstract
+        abstract = ""
+
+        abstract_elem = doc.find(ABSTRACT_P_PATH, header_only=True)
+        if abstract_elem is not None and abstract_elem.text:
+            abstract = abstract_elem.text
+
+        if not abstract:
+            abstract_div = doc.find(ABSTRACT_DIV_P_PATH, header_only=True)
+            if abstract_div is not None and abstract_div.text:
+                abstract = abstract_div.text
+
+        if not abstract:
+            abstract_elem = doc.find(ABSTRACT_PATH, header_only=True)
+            if abstract_elem is not None:
+                abstract = ''.join(abstract_elem.itertext()).strip()
+
+        if not abstract:
+            body_paragraphs = doc.full().findall(BODY_P_PATH, NS)
+            for p in body_paragraphs:
+                p_text = p.text if p.text else ""
+                if p_text and (p_text.startswith('Abstract') or p_text.strip().startswith('Abstract')):
+                    abstract = p_text
+                    break
+
+            if not abstract:
+                for p in body_paragraphs[:5]:
+                    p_text = ''.join(p.itertext()) if p is not None else ""
+                    if len(p_text) > 100 and ("we" in p_text.lower() or "introduce" in p_text.lower()):
+                        abstract = p_text
+                        break
+
+        # Un documento mal formado se descarta aunque su cabecera sea válida
+        doc.check_well_formed()
+
+        # Extracción de autores SOLO del artículo principal (no de la bibliografía)
+        authors = []
+        for author_elem in doc.findall_header(AUTHOR_PATH):
+            persName = author_elem.find('./tei:persName', NS)
+            if persName is not None:
+                firstname = persName.findtext('./tei:forename[@type="first"]', namespaces=NS) or ""
+                middlename = persName.findtext('./tei:forename[@type="middle"]', namespaces=NS) or ""
+                surname = persName.findtext('./tei:surname', namespaces=NS) or ""
+
+                # Si hay nombre o apellido, añadir a la lista de autores
+                if firstname or surname:
+                    authors.append({
+                        "firstname": firstname,
+                        "middlename": middlename,
+                        "lastname": surname
+                    })
+
+        # Verificamos si obtuvimos autores; si la lista está vacía, registramos en log
+        if not authors:
+            warnings.append(f"No se encontraron autores principales para {filename}")
+
+        # Crear diccionario de datos del paper
+        paper_data = {
+            "filename": filename,
+            "title": title,
+            "authors": authors,
+            "publicationYear": publicationYear,
+            "publishedIn": publishedIn,
+            "doi": doi,
+            "abstract": abstract
+        }
+        return filename, paper_data, warnings, None
+
+    except Exception as e:
+        import traceback
+        return filename, None, warnings, (str(e), traceback.format_exc())
+
+def _extract_item(item):
+    return extract_paper_metadata(*item)
+
+def iter_papers_metadata(processed_papers, workers=None):
+    """
+    Extrae los metadatos de todos los papers repartiéndolos en un pool de procesos.
+
+    Los documentos se envían en bloques de CHUNK_SIZE por proceso, así que
+    nunca hay más de unos pocos bloques en memoria. Los resultados se
+    devuelven en el mismo orden que ``processed_papers``.
+    """
+    workers = workers or os.cpu_count() or 1
+    items = iter(processed_papers.items())
+
+    if workers == 1:
+        yield from map(_extract_item, items)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            batch = list(islice(items, CHUNK_SIZE * workers))
+            if not batch:
+                break
+            yield from executor.map(_extract_item, batch, chunksize=CHUNK_SIZE)
+
+def extract_metadata_from_grobid_output(processed_papers, output_folder, output_filename, workers=None,
+                                        export_json=False):
     """
-    Extrae metadatos de los papers procesados por GROBID y los guarda en un archivo JSON.
+    Extrae metadatos de los papers procesados por GROBID y los guarda en un archivo JSON Lines.
     
     Args:
-        processed_papers: dict con {filename: grobid_xml_text}
-        output_folder: carpeta donde se guardará el archivo JSON
+        processed_papers: mapping con {filename: grobid_xml_text}; con un
+            TeiStore los documentos se leen de disco uno a uno
+        output_folder: carpeta donde se guardará el archivo JSON Lines
+        output_filename: nombre del archivo, un paper por línea
+        workers: número de procesos usados (por defecto, uno por CPU)
+        export_json: guardar también el JSON {"papers": [...]} de siempre
     """
     os.makedirs(output_folder, exist_ok=True)
     output_file = os.path.join(output_folder, output_filename)
     
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-    
-    papers_data = []
-    
-    for filename, xml_text in processed_papers.items():
-        try:
-            # Limpieza básica de XML mal formado
-            xml_text = xml_text.replace("&", "&amp;").replace("<abstract></abstract>", "<abstract/>")
-            
-            root = ET.fromstring(xml_text)
-            ns = {'tei': 'http://www.tei-c.org/ns/1.0'}
-
-            # Extracción de título
-            title = (root.findtext('.//tei:titleStmt/tei:title', namespaces=ns) or 
-                    root.findtext('.//tei:analytic/tei:title[@level="a"][@type="main"]', namespaces=ns) or
-                    root.findtext('.//tei:analytic/tei:title', namespaces=ns) or 
-                    root.findtext('.//tei:body//tei:p[contains(text(), "Robotics")]', namespaces=ns) or "")
-            
-            # Extracción de año de publicación
-            publicationYear = ""
-            date_elem = root.find('.//tei:publicationStmt/tei:date[@type="published"]', namespaces=ns)
-            if date_elem is not None:
-                date_text = date_elem.attrib.get('when', '')
-                match = re.search(r'(19|20)\d{2}', date_text)
-                if match:
-                    publicationYear = match.group(0)
-            
-            if not publicationYear:
-                date_elem = root.find('.//tei:imprint/tei:date[@type="published"]', namespaces=ns)
-                if date_elem is not None:
-                    date_text = date_elem.attrib.get('when', '')
-                    match = re.search(r'(19|20)\d{2}', date_text)
-                    if match:
-                        publicationYear = match.group(0)
-            
-            # Extracción de revista/conferencia
-            publishedIn = (
-                root.findtext('.//tei:monogr/tei:title[@level="j"][@type="main"]', namespaces=ns) or 
-                root.findtext('.//tei:monogr/tei:title[@level="j"]', namespaces=ns) or
-                root.findtext('.//tei:monogr/tei:meeting', namespaces=ns) or
-                ""
-            )
-            
-            # Extracción de DOI o identificador alternativo
-            doi = root.findtext('.//tei:idno[@type="DOI"]', namespaces=ns) or ""
-            
-            if not doi:
-                arxiv_id = root.findtext('.//tei:idno[@type="arXiv"]', namespaces=ns)
-                if arxiv_id:
-                    doi = f"arXiv:{arxiv_id}"
-            
-            # Extracción de abstract
-            abstract = ""
-            
-            abstract_elem = root.find('.//tei:profileDesc/tei:abstract/tei:p', namespaces=ns)
-            if abstract_elem is not None and abstract_elem.text:
-                abstract = abstract_elem.text
-            
-            if not abstract:
-                abstract_div = root.find('.//tei:profileDesc/tei:abstract/tei:div/tei:p', namespaces=ns)
-                if abstract_div is not None and abstract_div.text:
-                    abstract = abstract_div.text
-            
-            if not abstract:
-                abstract_elem = root.find('.//tei:profileDesc/tei:abstract', namespaces=ns)
-                if abstract_elem is not None:
-                    abstract = ''.join(abstract_elem.itertext()).strip()
-            
-            if not abstract:
-                body_paragraphs = root.findall('.//tei:body//tei:p', namespaces=ns)
-                for p in body_paragraphs:
-                    p_text = p.text if p.text else ""
-                    if p_text and (p_text.startswith('Abstract') or p_text.strip().startswith('Abstract')):
-                        abstract = p_text
-                        break
-                
-                if not abstract:
-                    for p in body_paragraphs[:5]:
-                        p_text = ''.join(p.itertext()) if p is not None else ""
-                        if len(p_text) > 100 and ("we" in p_text.lower() or "introduce" in p_text.lower()):
-                            abstract = p_text
-                            break
-            # Extracción de autores SOLO del artículo principal (no de la bibliografía)
-            authors = []
-            # Usamos una ruta XPath específica para los autores principales
-            author_elements = root.findall('.//tei:sourceDesc/tei:biblStruct/tei:analytic/tei:author', namespaces=ns)
-
-            # Si no encontramos autores con la ruta específica, no buscamos en otras partes
-            for author_elem in author_elements:
-                persName = author_elem.find('./tei:persName', namespaces=ns)
-                if persName is not None:
-                    firstname = persName.findtext('./tei:forename[@type="first"]', namespaces=ns) or ""
-                    middlename = persName.findtext('./tei:forename[@type="middle"]', namespaces=ns) or ""
-                    surname = persName.findtext('./tei:surname', namespaces=ns) or ""
-                    
-                    # Si hay nombre o apellido, añadir a la lista de autores
-                    if firstname or surname:
-                        author_data = {
-                            "firstname": firstname,
-                            "middlename": middlename,
-                            "lastname": surname
-                        }
-                        authors.append(author_data)
-
-            # Verificamos si obtuvimos autores; si la lista está vacía, registramos en log
-            if not authors:
-                logging.warning(f"No se encontraron autores principales para {filename}")
-
-            # Crear diccionario de datos del paper
-            paper_data = {
-                "filename": filename,
-                "title": title,
-                "authors": authors,  # Nueva entrada para autores
-                "publicationYear": publicationYear,
-                "publishedIn": publishedIn,
-                "doi": doi,
-                "abstract": abstract
-            }
-            
-            papers_data.append(paper_data)
+
+    def papers_data():
+        for filename, paper_data, warnings, error in iter_papers_metadata(processed_papers, workers):
+            for warning in warnings:
+                logging.warning(warning)
+            if error is not None:
+                logging.error(f"Error procesando {filename}: {error[0]}")
+                logging.error(error[1])
+                continue
             logging.info(f"Procesado correctamente: {filename}")
-            
-        except Exception as e:
-            logging.error(f"Error procesando {filename}: {e}")
-            import traceback
-            logging.error(traceback.format_exc())
-    
-    # Escribir todos los datos al archivo JSON
+            yield paper_data
+
+    # Escribir cada paper al archivo JSON Lines según se procesa
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump({"papers": papers_data}, f, ensure_ascii=False, indent=2)
-        logging.info(f"Archivo JSON guardado en: {output_file}")
+        count = write_papers(output_file, papers_data())
+        logging.info(f"Archivo JSON Lines guardado en: {output_file} ({count} papers)")
     except Exception as e:
-        logging.error(f"Error guardando archivo JSON: {e}")
+        logging.error(f"Error guardando archivo JSON Lines: {e}")
+        return 1
+
+    # Exportar opcionalmente al formato JSON anterior
+    if export_json:
+        try:
+            json_file = os.path.splitext(output_file)[0] + ".json"
+            export_json_file(output_file, json_file)
+            logging.info(f"Archivo JSON guardado en: {json_file}")
+        except Exception as e:
+            logging.error(f"Error guardando archivo JSON: {e}")
 
     # Escribir todos los datos al archivo CSV
     try:
@@ -159,7 +329,7 @@ def extract_metadata_from_grobid_output(processed_papers, output_folder, output_
             # Escribir encabezados
             writer.writerow(["filename", "title", "authors", "publicationYear", "publishedIn", "doi", "abstract"])
             # Escribir datos
-            for paper in papers_data:
+            for paper in read_papers(output_file):
                 writer.writerow([
                     paper["filename"],
                     paper["title"],
@@ -173,13 +343,6 @@ def extract_metadata_from_grobid_output(processed_papers, output_folder, output_
     except Exception as e:
         logging.error(f"Error guardando archivo CSV: {e}")
 
-    # También guardar la salida cruda de GROBID para uso posterior
-    try:
-        grobid_output_file = os.path.join(output_folder, "grobid_output.json")
-        with open(grobid_output_file, 'w', encoding='utf-8') as f:
-            json.dump(processed_papers, f, ensure_ascii=False)
-        logging.info(f"✅ GROBID output saved to: {grobid_output_file}")
-        return 0
-    except Exception as e:
-        logging.error(f"❌ Error saving GROBID output: {e}")
-        return 1
\ No newline at end of file
+    # La salida cruda de GROBID ya está en disco: process_papers guarda un
+    # fichero TEI por paper en output/grobid_tei a medida que llegan
+    return 0
\ No newline at end of file
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+# Default location and size budget of the TEI cache
+TEI_CACHE_DIR = os.path.join("output", "tei_cache")
+TEI_CACHE_MAX_BYTES = int(os.environ.get("TEI_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Return the hex SHA-256 digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_key(pdf_sha256, grobid_version, options):
+    """
+    Build the cache key of a TEI document.
+
+    The key covers the PDF content, the GROBID version and the request
+    options, so upgrading GROBID or changing e.g. consolidateHeader
+    never serves a stale document.
+    """
+    payload = json.dumps(
+        {"pdf": pdf_sha256, "grobid": grobid_version, "options": options},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class TeiCache:
+    """
+    Content-addressed on-disk cache of GROBID TEI documents.
+
+    Each entry is stored as ``<cache_dir>/<key[:2]>/<key>.tei.xml``. The
+    modification time of a file is its last access time, and evict()
+    removes the least recently used entries until the cache fits in
+    ``max_bytes``. The cache can be shared by the threads of a process.
+    """
+
+    def __init__(self, cache_dir=TEI_CACHE_DIR, max_bytes=TEI_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.tei.xml")
+
+    def get(self, key):
+        """Return the cached TEI text for ``key`` or None."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                tei = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        # Refresh the access time used by the LRU eviction
+        os.utime(path)
+        with self._lock:
+            self.hits += 1
+        return tei
+
+    def put(self, key, tei):
+        """Store ``tei`` under ``key``, atomically replacing any previous entry."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A temporary file of its own for each writer, thread or process
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with open(fd, "w", encoding="utf-8") as f:
+                f.write(tei)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".tei.xml"):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        removed = 0
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+
+        if removed:
+            logging.info(f"TEI cache: evicted {removed} entries, {total / 1024 ** 2:.1f} MB kept")
+        return removed
@@ -0,0 +1,59 @@
+import os
+from collections.abc import Mapping
+
+# Folder where the TEI document of every processed PDF is spooled
+TEI_STORE_DIR = os.path.join("output", "grobid_tei")
+TEI_SUFFIX = ".tei.xml"
+
+class TeiStore(Mapping):
+    """
+    Read-only mapping {pdf filename: TEI text} backed by one file per document.
+
+    Documents are only read from disk when they are accessed, so iterating
+    over ``items()`` keeps a single TEI string in memory at a time. Keys are
+    returned sorted by filename.
+    """
+
+    def __init__(self, store_dir=TEI_STORE_DIR):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+
+    def path(self, filename):
+        """Return the path of the TEI file of ``filename``."""
+        return os.path.join(self.store_dir, filename + TEI_SUFFIX)
+
+    def write(self, filename, tei):
+        """Store the TEI document of ``filename``, replacing it atomically."""
+        path = self.path(filename)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(tei)
+        os.replace(tmp_path, path)
+
+    def remove(self, filename):
+        """Remove the TEI document of ``filename`` if present."""
+        try:
+            os.remove(self.path(filename))
+        except FileNotFoundError:
+            pass
+
+    def __getitem__(self, filename):
+        try:
+            with open(self.path(filename), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(filename) from None
+
+    def __contains__(self, filename):
+        return os.path.exists(self.path(filename))
+
+    def __iter__(self):
+        names = sorted(
+            name[:-len(TEI_SUFFIX)]
+            for name in os.listdir(self.store_dir)
+            if name.endswith(TEI_SUFFIX)
+        )
+        return iter(names)
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.store_dir) if name.endswith(TEI_SUFFIX))
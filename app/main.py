@@ -1,15 +1,24 @@
 import argparse
 import logging
 from grobid.metadata_extractor import extract_metadata_from_grobid_output
-from grobid.grobid_client import process_papers
+from grobid.grobid_client import process_papers, GROBID_OPTIONS
+from grobid.tei_store import TeiStore, TEI_STORE_DIR
 from enrich.openalex_query import add_topics
-from enrich.json_to_rdf import json_to_rdf
-from enrich.wikidata_enrich import enrich_rdf_with_wikidata
+from enrich.json_to_rdf import json_to_rdf, index_path
+from enrich.wikidata_enrich import enrich_rdf_with_wikidata, publish_turtle
+from triplestore.loader import update_store, update_snapshot
+from triplestore.array_store import SNAPSHOT_DIR
+from triplestore.sqlite_store import SQLITE_STORE_FILE
+from search.loader import update_search_index
+from search.inverted_index import SEARCH_INDEX_DIR
 from similarity.paper_similarity import similarity_score
+from similarity.neighbors import NEIGHBORS_DIR
 from ner.extract_acknowledgements import named_entity_recognition
 from provenance.create_prov import create_provenance_document
 from ro_create.create_ro_crate import create_ro_crate_metadata
 from topic_modeling.abstract_topics import create_topic_modeling
+from pipeline.manifest import StageManifest, stage_fingerprint
+from collections import namedtuple
 import os
 import subprocess
 import sys
@@ -18,15 +27,33 @@ import time
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-def run_api_services():
-    """Run both API and SPARQL endpoint services as subprocesses."""
-    api_path = os.path.join("..", "api", "api.py")
-    sparql_path = os.path.join("..", "api", "sparql_endpoint.py")
+OUTPUT_FOLDER = "output"
+DATA_FOLDER = os.path.join("..", "data")
+SIMILARITY_THRESHOLD = 0.45
+
+def run_api_services(production=False, workers=None, threads=None):
+    """
+    Run the API and SPARQL endpoint services as subprocesses.
+
+    By default each one runs on its own Flask development server. In
+    production mode both run in one app under gunicorn: the graph is loaded
+    once before forking ``workers`` processes of ``threads`` threads each.
+    """
+    api_folder = os.path.join("..", "api")
     
     logging.info("Starting API and SPARQL endpoint services...")
     
-    api_process = subprocess.Popen([sys.executable, api_path])
-    sparql_process = subprocess.Popen([sys.executable, sparql_path])
+    if production:
+        env = dict(os.environ)
+        if workers:
+            env["API_WORKERS"] = str(workers)
+        if threads:
+            env["API_THREADS"] = str(threads)
+        processes = [subprocess.Popen([sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "wsgi:app"],
+                                      cwd=api_folder, env=env)]
+    else:
+        processes = [subprocess.Popen([sys.executable, os.path.join(api_folder, "api.py")]),
+                     subprocess.Popen([sys.executable, os.path.join(api_folder, "sparql_endpoint.py")])]
     
     logging.info("API running on http://localhost:5001")
     logging.info("SPARQL endpoint running on http://localhost:5000")
@@ -40,71 +67,210 @@ def run_api_services():
         pass
     finally:
         logging.info("Shutting down services...")
-        api_process.terminate()
-        sparql_process.terminate()
-        api_process.wait(timeout=5)
-        sparql_process.wait(timeout=5)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=5)
 
-def run_analysis_pipeline():
-    """Run the complete data analysis pipeline."""
-    output_folder = "output"
+# Stages of the analysis pipeline. Each stage declares the files it reads
+# and writes, its parameters and the modules that implement it; together
+# they form the fingerprint stored in the stage manifest.
+Stage = namedtuple("Stage", "name run inputs outputs params modules error abort")
 
-    logging.info("Initializing analysis...")
+def output_path(filename):
+    return os.path.join(OUTPUT_FOLDER, filename)
 
-    # Step 1: Process PDFs
-    papers = process_papers("../data") 
-    
-    if papers == 1:
-        print("Error processing the papers: Aborting")
-        return
+def build_stages(similarity_threshold=SIMILARITY_THRESHOLD, export_json=False, turtle=False,
+                 rebuild_graph=False):
+    """Return the ordered list of pipeline stages."""
+    # Stages hand papers over in JSON Lines files, one paper per line
+    metadata_jsonl = output_path("papers_metadata.jsonl")
+    openalex_jsonl = output_path("papers_with_openalex.jsonl")
+    json_exports = {metadata_jsonl: [], openalex_jsonl: []}
+    if export_json:
+        json_exports = {path: [os.path.splitext(path)[0] + ".json"] for path in json_exports}
+    # The graph is kept as N-Triples plus a small owl:sameAs delta; Turtle
+    # is only written on request, as a publishing artifact
+    topics_nt = output_path("papers_with_topics.nt")
+    sameas_nt = output_path("papers_wikidata_sameas.nt")
+    enriched_ttl = output_path("papers_wikidata_enriched.ttl")
+    store_db = output_path(SQLITE_STORE_FILE)
+    snapshot = output_path(SNAPSHOT_DIR)
+    search_index = output_path(SEARCH_INDEX_DIR)
+    neighbors = output_path(NEIGHBORS_DIR)
+    topic_models = [output_path("topics_LDA.json"), output_path("topics_BERTopic.json")]
+    similarities_json = output_path("paper_similarities.json")
+    acknowledgements_json = output_path("acknowledgements_analysis.json")
+    provenance = output_path("provenance.provn")
+    # The provenance and the RO-Crate describe the results of the analysis,
+    # so they are written again whenever one of them changes
+    analysis_outputs = [metadata_jsonl, openalex_jsonl, topics_nt, sameas_nt, *topic_models,
+                        similarities_json, acknowledgements_json]
 
-    # Step 2: Extract metadata and generate json
-    if extract_metadata_from_grobid_output(papers, "output", "papers_metadata.json") == 1:
-        print("Error getting metadata of papers: Aborting")
-        return
+    return [
+        # Step 1: Process PDFs
+        Stage("grobid",
+              lambda: 1 if process_papers(DATA_FOLDER) == 1 else 0,
+              [DATA_FOLDER], [TEI_STORE_DIR],
+              {"options": GROBID_OPTIONS},
+              ["grobid.grobid_client", "grobid.tei_cache", "grobid.tei_store"],
+              "Error processing the papers: Aborting", True),
+        # Step 2: Extract metadata and generate json
+        Stage("metadata",
+              lambda: extract_metadata_from_grobid_output(TeiStore(TEI_STORE_DIR), OUTPUT_FOLDER,
+                                                          "papers_metadata.jsonl", export_json=export_json),
+              [TEI_STORE_DIR], [metadata_jsonl, output_path("papers_metadata.csv")] + json_exports[metadata_jsonl],
+              {"export_json": export_json},
+              ["grobid.metadata_extractor"],
+              "Error getting metadata of papers: Aborting", True),
+        # Step 3: Add topics to json with openalex
+        Stage("openalex",
+              lambda: add_topics(metadata_jsonl, openalex_jsonl, export_json=export_json),
+              [metadata_jsonl], [openalex_jsonl] + json_exports[openalex_jsonl],
+              {"export_json": export_json},
+              ["enrich.openalex_query"],
+              "Error adding topics: Aborting", True),
+        # Step 4: Convert json to rdf file, updating only the papers that changed
+        Stage("rdf",
+              lambda: json_to_rdf(openalex_jsonl, topics_nt, incremental=not rebuild_graph),
+              [openalex_jsonl], [topics_nt, index_path(topics_nt)], {"rebuild": rebuild_graph},
+              ["enrich.json_to_rdf"],
+              "Error transforming to RDF: Aborting", True),
+        # Step 5: Enrich rdf file with wikidata
+        Stage("wikidata",
+              lambda: enrich_rdf_with_wikidata(topics_nt, sameas_nt),
+              [topics_nt], [sameas_nt], {},
+              ["enrich.wikidata_enrich"],
+              "Error perfoming enrichment with wikidata: Aborting", True),
+        # Index titles and abstracts for the full-text search of the API
+        Stage("search",
+              lambda: update_search_index(openalex_jsonl, search_index),
+              [openalex_jsonl], [search_index], {},
+              ["search.loader", "search.inverted_index"],
+              "Error building the search index", False),
+        # Load the graph into the triple store opened by the API services
+        Stage("store",
+              lambda: update_store(store_db, topics_nt, sameas_nt),
+              [topics_nt, sameas_nt], [store_db], {},
+              ["triplestore.loader", "triplestore.sqlite_store"],
+              "Error loading the triple store", False),
+        # Write the memory-mapped snapshot served by the API processes
+        Stage("snapshot",
+              lambda: update_snapshot(store_db, snapshot),
+              [store_db], [snapshot], {},
+              ["triplestore.array_store"],
+              "Error writing the graph snapshot", False),
+        # Optionally publish the enriched graph as a single Turtle file
+        Stage("publish",
+              lambda: publish_turtle([topics_nt, sameas_nt], enriched_ttl) if turtle else 0,
+              [topics_nt, sameas_nt], [enriched_ttl] if turtle else [], {"turtle": turtle},
+              ["enrich.wikidata_enrich"],
+              "Error publishing the enriched RDF as Turtle", False),
+        # Step 6: Run Topic Modeling on Abstracts
+        Stage("topic_modeling",
+              create_topic_modeling,
+              [openalex_jsonl], topic_models, {},
+              ["topic_modeling.abstract_topics"],
+              "Error running topic modeling", False),
+        # Step 7: Generate similarity score between papers based on topics
+        Stage("similarity",
+              lambda: similarity_score(openalex_jsonl, similarities_json, similarity_threshold, neighbors),
+              [openalex_jsonl], [similarities_json, neighbors],
+              {"threshold": similarity_threshold},
+              ["similarity.paper_similarity", "similarity.neighbors"],
+              "Error analalysing similarities", False),
+        # Step 8: Extracting named entities from acknowledgements
+        Stage("ner",
+              named_entity_recognition,
+              [openalex_jsonl, TEI_STORE_DIR], [acknowledgements_json], {},
+              ["ner.extract_acknowledgements"],
+              "Error extracting named entities", False),
+        # Step 9: Generate provenance
+        Stage("provenance",
+              create_provenance_document,
+              analysis_outputs, [provenance], {},
+              ["provenance.create_prov"],
+              "Error generating provenance", False),
+        # Step 10: Package as Research Object
+        Stage("ro_crate",
+              create_ro_crate_metadata,
+              analysis_outputs + [provenance], [output_path("ro-crate-metadata.json")], {},
+              ["ro_create.create_ro_crate"],
+              "Error creating RO-Crate metadata", False),
+    ]
 
-    logging.info("Metadata extracted with Grobid. Output saved in /output/grobid_output.json")
+STAGE_NAMES = [stage.name for stage in build_stages()]
 
-    # Step 3: Add topics to json with openalex
-    if add_topics(os.path.join(output_folder,"papers_metadata.json"),
-                  os.path.join(output_folder,"papers_with_openalex.json")) == 1:
-        print("Error adding topics: Aborting")
-        return
+def run_analysis_pipeline(force=None, from_stage=None, similarity_threshold=SIMILARITY_THRESHOLD,
+                          export_json=False, publish_turtle=False, rebuild_graph=False):
+    """
+    Run the complete data analysis pipeline.
 
-    # Step 4: Convert json to rdf file
-    if json_to_rdf(os.path.join(output_folder,"papers_with_openalex.json"),
-                   os.path.join(output_folder,"papers_with_topics.ttl")) == 1:
-        print("Error transforming to RDF: Aborting")
-        return
+    Stages whose inputs, code and parameters have not changed since their
+    last successful run are skipped and their previous outputs reused.
 
-    # Step 5: Enrich rdf file with wikidata
-    if enrich_rdf_with_wikidata(os.path.join(output_folder,"papers_with_topics.ttl"),
-                               os.path.join(output_folder,"papers_wikidata_enriched.ttl")) == 1:
-        print("Error perfoming enrichment with wikidata: Aborting")
-        return 
+    Args:
+        force: stage names to re-run unconditionally; an empty list forces all
+        from_stage: re-run this stage and every stage after it
+        similarity_threshold: minimum similarity of the edges of the network
+        export_json: also write the intermediate papers as {"papers": [...]} JSON
+        publish_turtle: also write the enriched graph as papers_wikidata_enriched.ttl
+        rebuild_graph: rebuild the RDF graph from scratch instead of updating it
+    """
+    logging.info("Initializing analysis...")
 
-    # Step 6: Run Topic Modeling on Abstracts
-    create_topic_modeling()
+    manifest = StageManifest()
+    stages = build_stages(similarity_threshold, export_json, publish_turtle, rebuild_graph)
 
-    # Step 6: Generate similarity score between papers based on topics
-    if similarity_score(os.path.join(output_folder,"papers_with_openalex.json"),
-                       os.path.join(output_folder,"paper_similarities.json")) == 1:
-        print("Error analalysing similarities")
+    forced = set()
+    if force is not None:
+        forced.update(force or STAGE_NAMES)
+    if from_stage is not None:
+        forced.update(STAGE_NAMES[STAGE_NAMES.index(from_stage):])
 
-    # Step 7: Extracting named entities from acknowledgements
-    named_entity_recognition()
+    for stage in stages:
+        fingerprint = stage_fingerprint(stage.inputs, stage.modules, stage.params)
+        if stage.name not in forced and manifest.is_up_to_date(stage.name, fingerprint, stage.outputs):
+            logging.info(f"Stage '{stage.name}' is up to date, reusing its outputs")
+            continue
 
-    # Step 8: Generate provenance
-    create_provenance_document()
+        logging.info(f"Running stage '{stage.name}'...")
+        if stage.run() == 1:
+            manifest.invalidate(stage.name)
+            print(stage.error)
+            if stage.abort:
+                return
+            continue
 
-    # Step 9: Package as Research Object
-    create_ro_crate_metadata()
+        manifest.record(stage.name, fingerprint, stage.outputs)
 
 def main():
-    run_analysis_pipeline()
+    parser = argparse.ArgumentParser(description="Run the paper analysis pipeline and serve its results.")
+    parser.add_argument("--force", nargs="*", choices=STAGE_NAMES, metavar="STAGE",
+                        help="re-run the given stages even if they are up to date (all stages if none given)")
+    parser.add_argument("--from-stage", choices=STAGE_NAMES,
+                        help="re-run this stage and every stage after it")
+    parser.add_argument("--similarity-threshold", type=float, default=SIMILARITY_THRESHOLD,
+                        help="minimum similarity of the edges of the similarity network")
+    parser.add_argument("--export-json", action="store_true",
+                        help="also export the intermediate JSON Lines files as {\"papers\": [...]} JSON")
+    parser.add_argument("--publish-turtle", action="store_true",
+                        help="also write the enriched graph as a single Turtle file")
+    parser.add_argument("--rebuild-graph", action="store_true",
+                        help="rebuild the RDF graph from scratch instead of updating the changed papers")
+    parser.add_argument("--production", action="store_true",
+                        help="serve the API and SPARQL endpoint together under gunicorn with several workers")
+    parser.add_argument("--workers", type=int,
+                        help="number of server processes in production mode (default: number of CPUs)")
+    parser.add_argument("--threads", type=int,
+                        help="number of threads per server process in production mode (default: 4)")
+    args = parser.parse_args()
+
+    run_analysis_pipeline(args.force, args.from_stage, args.similarity_threshold, args.export_json,
+                          args.publish_turtle, args.rebuild_graph)
     
     # Run API services
-    run_api_services()
+    run_api_services(args.production, args.workers, args.threads)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,35 +3,33 @@ import re
 import os
 from transformers import pipeline
 import matplotlib.pyplot as plt
+from grobid.tei_store import TeiStore, TEI_STORE_DIR
+from pipeline.papers_jsonl import read_papers
 
 def load_papers():
-    """Load paper data from JSON file"""
-    with open(os.path.join("output","papers_with_openalex.json"), "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data["papers"]
+    """Iterate over the papers of the JSON Lines file without loading it whole"""
+    return read_papers(os.path.join("output","papers_with_openalex.jsonl"))
 
 # Modify load_papers function to also load GROBID XML
 def load_papers_with_grobid():
-    """Load papers with GROBID XML if available"""
-    # Load papers metadata
-    with open(os.path.join("output","papers_with_openalex.json"), "r", encoding="utf-8") as f:
-        data = json.load(f)
-    papers = data["papers"]
-    
-    # Try to load GROBID output
-    grobid_papers = {}
-    try:
-        with open(os.path.join("output","grobid_output.json"), "r", encoding="utf-8") as f:
-            grobid_papers = json.load(f)
-    except FileNotFoundError:
-        print("No GROBID output file found")
-    
-    # Merge GROBID data with papers
-    for i, paper in enumerate(papers):
-        if paper["filename"] in grobid_papers:
-            paper["grobid_xml"] = grobid_papers[paper["filename"]]
-    
-    return papers
+    """Load papers with GROBID XML if available.
+
+    Returns a generator: each paper and its TEI document are read from disk
+    only when that paper is reached.
+    """
+    # Papers metadata is read lazily as well
+    papers = load_papers()
+
+    # GROBID output is stored as one TEI file per paper
+    grobid_papers = TeiStore(TEI_STORE_DIR) if os.path.isdir(TEI_STORE_DIR) else {}
+    if not grobid_papers:
+        print("No GROBID output folder found")
+
+    # Merge GROBID data with papers, one document at a time
+    for paper in papers:
+        paper["grobid_xml"] = grobid_papers.get(paper["filename"])
+        yield paper
+        paper.pop("grobid_xml", None)
 
 def extract_acknowledgements(paper_text):
     """Extract acknowledgements section from paper full text"""
@@ -233,8 +231,7 @@ def visualize_funding_organizations(results):
 def named_entity_recognition():
     # Load papers
     papers = load_papers_with_grobid()
-    print(f"Loaded {len(papers)} papers")
-    
+
     # Extract acknowledgements and perform NER
     results = process_papers_acknowledgements(papers)
     print(f"Processed acknowledgements for {len(results)} papers")
\ No newline at end of file
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+MANIFEST_PATH = os.path.join("output", "pipeline_manifest.json")
+
+def _hash_file(digest, path, chunk_size=1024 * 1024):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+
+def fingerprint_inputs(paths):
+    """
+    Fingerprint the input files and folders of a stage.
+
+    Files are hashed by content, so rewriting an identical file does not
+    invalidate the stages that read it. Folders (the PDF corpus, the TEI
+    spool) can hold thousands of large files and are fingerprinted by the
+    name, size and modification time of their entries.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.encode("utf-8"))
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                stat = os.stat(os.path.join(path, name))
+                digest.update(f"{name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+        elif os.path.isfile(path):
+            _hash_file(digest, path)
+        else:
+            digest.update(b"<missing>")
+    return digest.hexdigest()
+
+def fingerprint_code(module_names):
+    """Fingerprint the source files of the modules that implement a stage."""
+    digest = hashlib.sha256()
+    for name in sorted(module_names):
+        module = sys.modules.get(name)
+        source = getattr(module, "__file__", None)
+        digest.update(name.encode("utf-8"))
+        if source and os.path.isfile(source):
+            _hash_file(digest, source)
+    return digest.hexdigest()
+
+def stage_fingerprint(inputs, modules, params):
+    """Combine inputs, code version and parameters into one stage fingerprint."""
+    payload = json.dumps({
+        "inputs": fingerprint_inputs(inputs),
+        "code": fingerprint_code(modules),
+        "params": params,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class StageManifest:
+    """
+    Record of the last successful run of every pipeline stage.
+
+    The manifest is a JSON file mapping each stage name to the fingerprint
+    it ran with and the outputs it produced. A stage is up to date when its
+    current fingerprint matches the recorded one and all its outputs still
+    exist.
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.stages = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.stages = json.load(f).get("stages", {})
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable pipeline manifest {path}: {e}")
+
+    def is_up_to_date(self, name, fingerprint, outputs):
+        entry = self.stages.get(name)
+        if entry is None or entry.get("fingerprint") != fingerprint:
+            return False
+        return all(os.path.exists(path) for path in outputs)
+
+    def record(self, name, fingerprint, outputs):
+        self.stages[name] = {
+            "fingerprint": fingerprint,
+            "outputs": list(outputs),
+            "completed": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self.save()
+
+    def invalidate(self, name):
+        if self.stages.pop(name, None) is not None:
+            self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"stages": self.stages}, f, indent=2)
+        os.replace(tmp_path, self.path)
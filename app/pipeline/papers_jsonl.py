@@ -0,0 +1,59 @@
+import json
+import os
+
+def read_papers(path):
+    """
+    Iterate over the papers stored in ``path``.
+
+    JSON Lines files (one paper per line) are read lazily, so processing can
+    start before the file has been parsed and memory use does not depend on
+    the number of papers. Legacy ``{"papers": [...]}`` JSON files are still
+    accepted, but are loaded whole.
+    """
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)["papers"]
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def write_papers(path, papers):
+    """
+    Write ``papers`` to the JSON Lines file ``path``, one paper per line.
+
+    Papers are written as they are produced by the iterable. The file is
+    replaced atomically when complete, so readers never see a partial file.
+    Returns the number of papers written.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for paper in papers:
+            f.write(json.dumps(paper, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+def export_json(jsonl_path, json_path):
+    """
+    Export a JSON Lines file as the legacy ``{"papers": [...]}`` document.
+
+    The output is byte-identical to ``json.dump(..., ensure_ascii=False,
+    indent=2)`` of the whole list, but it is written one paper at a time.
+    """
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write('{\n  "papers": [')
+        first = True
+        for paper in read_papers(jsonl_path):
+            body = json.dumps(paper, ensure_ascii=False, indent=2).replace("\n", "\n    ")
+            f.write("\n    " if first else ",\n    ")
+            f.write(body)
+            first = False
+        f.write("]\n}" if first else "\n  ]\n}")
+    os.replace(tmp_path, json_path)
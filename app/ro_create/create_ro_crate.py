@@ -24,7 +24,8 @@ def create_ro_crate_metadata():
                 "hasPart": [
                     {"@id": "data/"},
                     {"@id": "output/"},
-                    {"@id": "papers_wikidata_enriched.ttl"}
+                    {"@id": "papers_with_topics.nt"},
+                    {"@id": "papers_wikidata_sameas.nt"}
                 ]
             },
             {
@@ -60,11 +61,18 @@ def create_ro_crate_metadata():
                 "description": "Output files from the analysis, including visualizations and JSON data"
             },
             {
-                "@id": "papers_wikidata_enriched.ttl",
+                "@id": "papers_with_topics.nt",
                 "@type": "File",
-                "name": "Knowledge Graph (Turtle format)",
-                "description": "RDF knowledge graph of papers with Wikidata links",
-                "encodingFormat": "text/turtle"
+                "name": "Knowledge Graph (N-Triples format)",
+                "description": "RDF knowledge graph of papers, authors and OpenAlex topics",
+                "encodingFormat": "application/n-triples"
+            },
+            {
+                "@id": "papers_wikidata_sameas.nt",
+                "@type": "File",
+                "name": "Wikidata links (N-Triples format)",
+                "description": "owl:sameAs links from the topics and authors of the knowledge graph to Wikidata",
+                "encodingFormat": "application/n-triples"
             },
             {
                 "@id": "topic_modeling/abstract_topics.py",
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+from array import array
+from collections import Counter
+import numpy as np
+
+# Full-text index of paper titles and abstracts served by the API processes
+SEARCH_INDEX_DIR = "search_index"
+
+# BM25 parameters; title words count TITLE_WEIGHT times in a paper's text
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_WEIGHT = 2
+
+_TOKEN = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+a an and are as at be been but by can for from has have in into is it its not of on or our that
+the their these this those to was we were which with
+""".split())
+
+def tokenize(text):
+    """Lowercase words of ``text``, without stopwords and one-letter words."""
+    return [token for token in _TOKEN.findall(text.casefold()) if len(token) > 1 and token not in STOPWORDS]
+
+def index_version(index_path):
+    """Version of the search index at ``index_path``, or None if there is none."""
+    try:
+        with open(os.path.join(index_path, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)["version"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def build_search_index(papers, index_path):
+    """
+    Write the BM25 index of the titles and abstracts of ``papers``, an
+    iterable of (paper id, paper) pairs.
+
+    Each term has a posting list of the papers it occurs in, sorted by
+    paper, with the BM25 weight of the term in each paper, so that a query
+    only adds up the weights of its terms. The index is written to a new
+    directory that then replaces ``index_path``; processes that have the
+    previous index mapped keep reading it. Returns the number of papers.
+    """
+    terms = {}
+    term_col, doc_col, tf_col, lengths = array("i"), array("i"), array("i"), array("i")
+    paper_ids = []
+    digest = hashlib.sha256(json.dumps([BM25_K1, BM25_B, TITLE_WEIGHT, sorted(STOPWORDS)]).encode("utf-8"))
+
+    for doc, (pid, paper) in enumerate(papers):
+        title, abstract = paper.get("title") or "", paper.get("abstract") or ""
+        digest.update(json.dumps([pid, title, abstract], ensure_ascii=False).encode("utf-8"))
+        paper_ids.append(pid)
+        counts = Counter(tokenize(abstract))
+        for token in tokenize(title):
+            counts[token] += TITLE_WEIGHT
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            term_col.append(terms.setdefault(term, len(terms)))
+            doc_col.append(doc)
+            tf_col.append(tf)
+
+    term_col = np.frombuffer(term_col, dtype=np.int32)
+    doc_col = np.frombuffer(doc_col, dtype=np.int32)
+    tf = np.frombuffer(tf_col, dtype=np.int32).astype(np.float32)
+    lengths = np.frombuffer(lengths, dtype=np.int32).astype(np.float32)
+
+    # Postings grouped by term, each group sorted by paper
+    order = np.lexsort((doc_col, term_col))
+    term_col, doc_col, tf = term_col[order], doc_col[order], tf[order]
+    df = np.bincount(term_col, minlength=len(terms))
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(df, out=offsets[1:])
+
+    n = len(paper_ids)
+    avgdl = float(lengths.mean()) if n else 0.0
+    idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_col] / max(avgdl, 1.0))
+    weights = idf[term_col] * tf * (BM25_K1 + 1) / (tf + norm)
+
+    tmp_path = index_path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_path, "docs.npy"), doc_col)
+    np.save(os.path.join(tmp_path, "weights.npy"), weights.astype(np.float32))
+    with open(os.path.join(tmp_path, "terms.json"), "w", encoding="utf-8") as f:
+        json.dump(list(terms), f, ensure_ascii=False)
+    with open(os.path.join(tmp_path, "papers.json"), "w", encoding="utf-8") as f:
+        json.dump(paper_ids, f)
+    info = {
+        "version": digest.hexdigest()[:16],
+        "papers": n,
+        "terms": len(terms),
+        "postings": int(len(doc_col)),
+        "avgdl": avgdl,
+        "k1": BM25_K1,
+        "b": BM25_B,
+        "title_weight": TITLE_WEIGHT,
+    }
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+
+    # Swap the directories; the old files stay readable while mapped
+    old_path = index_path + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(index_path):
+        os.rename(index_path, old_path)
+    os.rename(tmp_path, index_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return n
+
+class SearchIndex:
+    """
+    Read-only BM25 search over an index written by build_search_index().
+
+    The posting arrays are memory-mapped, so processes serving the same
+    index share their pages. A query adds the weights of the postings of
+    its terms into one score per paper and ranks the papers that matched.
+    """
+
+    def __init__(self, index_path):
+        with open(os.path.join(index_path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(index_path, "terms.json"), "r", encoding="utf-8") as f:
+            self.terms = {term: i for i, term in enumerate(json.load(f))}
+        with open(os.path.join(index_path, "papers.json"), "r", encoding="utf-8") as f:
+            self.paper_ids = json.load(f)
+        load = lambda name: np.asarray(np.load(os.path.join(index_path, name), mmap_mode="r"))
+        self.offsets = load("offsets.npy")
+        self.docs = load("docs.npy")
+        self.weights = load("weights.npy")
+        self.version = self.meta["version"]
+
+    def search(self, query, limit=10, offset=0):
+        """
+        Rank the papers matching any term of ``query`` by BM25 score.
+
+        Returns the number of matching papers and the (paper id, score)
+        pairs of ranks ``offset`` to ``offset + limit``.
+        """
+        term_ids = {self.terms[token] for token in tokenize(query) if token in self.terms}
+        if not term_ids:
+            return 0, []
+        scores = np.zeros(len(self.paper_ids), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # A paper occurs once in a posting list
+            scores[self.docs[start:end]] += self.weights[start:end]
+        matched = np.flatnonzero(scores)
+        total, count = len(matched), offset + limit
+        if count < total:
+            # Papers scoring at least the count-th best score, ties included,
+            # so that consecutive pages agree on the order of tied papers
+            kth = np.partition(-scores[matched], count - 1)[count - 1]
+            matched = matched[-scores[matched] <= kth]
+        # Best score first; ties in the order of the papers file
+        ranked = matched[np.lexsort((matched, -scores[matched]))][offset:count]
+        return total, [(self.paper_ids[doc], float(scores[doc])) for doc in ranked]
@@ -0,0 +1,14 @@
+import os
+from pipeline.papers_jsonl import read_papers
+from enrich.json_to_rdf import unique_papers
+from search.inverted_index import build_search_index
+
+def update_search_index(papers_path, index_path):
+    """Write the full-text search index of the papers in ``papers_path``."""
+    if not os.path.exists(papers_path):
+        print(f"❌ Error: can't open file {papers_path}")
+        return 1
+    # Papers get the ids of their URIs in the graph
+    count = build_search_index(unique_papers(read_papers(papers_path)), index_path)
+    print(f"✅ Search index of {count} papers saved to '{index_path}'")
+    return 0
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+# Nearest neighbours of each paper, served by the API processes
+NEIGHBORS_DIR = "paper_neighbors"
+# Neighbours kept per paper
+NEIGHBORS_K = 50
+# Papers compared with the whole corpus at a time
+BLOCK_SIZE = 256
+
+def top_k_neighbors(embeddings, k=NEIGHBORS_K, block_size=BLOCK_SIZE):
+    """
+    Return the ``k`` most similar rows of each row of ``embeddings``, by
+    cosine similarity, as (neighbour indices, scores) arrays of shape (n, k)
+    sorted by decreasing score.
+
+    Rows are compared with the whole matrix one block at a time, so memory
+    use grows with ``block_size * n`` instead of ``n * n``.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    n = len(vectors)
+    k = max(min(k, n - 1), 0)
+    neighbors = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float32)
+    if not k:
+        return neighbors, scores
+
+    for start in range(0, n, block_size):
+        similarities = vectors[start:start + block_size] @ vectors.T
+        rows = np.arange(len(similarities))
+        # A paper is not its own neighbour
+        similarities[rows, start + rows] = -np.inf
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        neighbors[start:start + len(rows)] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + len(rows)] = np.take_along_axis(top_scores, order, axis=1)
+    return neighbors, scores
+
+def neighbors_version(neighbors_path):
+    """Version of the neighbour lists at ``neighbors_path``, or None if there are none."""
+    try:
+        with open(os.path.join(neighbors_path, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)["version"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+def save_neighbors(neighbors_path, paper_ids, embeddings, k=NEIGHBORS_K):
+    """
+    Write the top-``k`` neighbours of each paper, given the ids of the papers
+    and their embeddings in the same order. A paper id that occurs more than
+    once keeps its first embedding.
+
+    Neighbours are stored as an (n, k) array of paper positions and an
+    (n, k) array of float16 scores; the directory replaces
+    ``neighbors_path`` when complete. Returns the number of papers.
+    """
+    positions = {}
+    for i, pid in enumerate(paper_ids):
+        positions.setdefault(pid, i)
+    ids = list(positions)
+    embeddings = np.asarray(embeddings)[list(positions.values())] if ids else np.zeros((0, 1))
+    neighbors, scores = top_k_neighbors(embeddings, k)
+    scores = scores.astype(np.float16)
+
+    tmp_path = neighbors_path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, "neighbors.npy"), neighbors)
+    np.save(os.path.join(tmp_path, "scores.npy"), scores)
+    with open(os.path.join(tmp_path, "papers.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    digest = hashlib.sha256(json.dumps(ids).encode("utf-8"))
+    digest.update(neighbors.tobytes())
+    digest.update(scores.tobytes())
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": digest.hexdigest()[:16], "papers": len(ids), "k": int(neighbors.shape[1])}, f, indent=2)
+
+    # Swap the directories; the old files stay readable while mapped
+    old_path = neighbors_path + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(neighbors_path):
+        os.rename(neighbors_path, old_path)
+    os.rename(tmp_path, neighbors_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return len(ids)
+
+class PaperNeighbors:
+    """Read-only neighbour lists written by save_neighbors(), memory-mapped."""
+
+    def __init__(self, neighbors_path):
+        with open(os.path.join(neighbors_path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(neighbors_path, "papers.json"), "r", encoding="utf-8") as f:
+            self.paper_ids = json.load(f)
+        self.positions = {pid: i for i, pid in enumerate(self.paper_ids)}
+        load = lambda name: np.asarray(np.load(os.path.join(neighbors_path, name), mmap_mode="r"))
+        self.neighbors = load("neighbors.npy")
+        self.scores = load("scores.npy")
+        self.k = self.meta["k"]
+
+    def similar(self, paper_id, k=10):
+        """
+        (paper id, score) pairs of the ``k`` papers most similar to
+        ``paper_id``, or None if the paper has no neighbour list.
+        """
+        row = self.positions.get(paper_id)
+        if row is None:
+            return None
+        return [(self.paper_ids[j], float(score))
+                for j, score in zip(self.neighbors[row, :k].tolist(), self.scores[row, :k].tolist())]
@@ -5,12 +5,13 @@ from sklearn.metrics.pairwise import cosine_similarity
 import matplotlib.pyplot as plt
 import networkx as nx
 import os
+from pipeline.papers_jsonl import read_papers
+from enrich.json_to_rdf import paper_id
+from similarity.neighbors import save_neighbors
 
 def load_papers(file_path):
-    """Load paper data from JSON file"""
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data["papers"]
+    """Iterate over the papers of a JSON Lines file without loading it whole"""
+    return read_papers(file_path)
 
 def create_abstract_embeddings(papers):
     """Create embeddings for paper abstracts using a transformer model"""
@@ -22,6 +23,8 @@ def create_abstract_embeddings(papers):
     abstracts = []
     paper_ids = []
     titles = []
+    # Ids of the papers' URIs in the knowledge graph
+    graph_ids = []
     
     for i, paper in enumerate(papers):
         abstract = paper.get("abstract", "")
@@ -29,12 +32,13 @@ def create_abstract_embeddings(papers):
             abstracts.append(abstract)
             paper_ids.append(i)
             titles.append(paper.get("title", f"Paper {i}"))
+            graph_ids.append(paper_id(paper))
     
     # Create embeddings
     print(f"Creating embeddings for {len(abstracts)} abstracts...")
     embeddings = model.encode(abstracts)
     
-    return embeddings, paper_ids, titles
+    return embeddings, paper_ids, titles, graph_ids
 
 def calculate_similarity_matrix(embeddings):
     """Calculate cosine similarity matrix between embeddings"""
@@ -122,13 +126,17 @@ def visualize_similarity_network(similarity_matrix, paper_ids, titles, output_pa
     print(f"✓ Similarity network visualization saved in output/similarity_network.png")
 
 
-def similarity_score(file_path, output_path):
+def similarity_score(file_path, output_path, threshold=0.45, neighbors_path=None):
     # Load papers
     papers = load_papers(file_path)
-    print(f"Loaded {len(papers)} papers")
     
     # Create embeddings
-    embeddings, paper_ids, titles = create_abstract_embeddings(papers)
+    embeddings, paper_ids, titles, graph_ids = create_abstract_embeddings(papers)
+    
+    # Save the nearest neighbours of each paper for the API
+    if neighbors_path:
+        count = save_neighbors(neighbors_path, graph_ids, embeddings)
+        print(f"✓ Nearest neighbours of {count} papers saved in {neighbors_path}")
     
     # Calculate similarity matrix
     similarity_matrix = calculate_similarity_matrix(embeddings)
@@ -140,4 +148,4 @@ def similarity_score(file_path, output_path):
         print(f"{i+1}. [{pair['similarity']:.2f}] '{pair['paper1_title']}' and '{pair['paper2_title']}'")
     
     # Visualize similarity network
-    visualize_similarity_network(similarity_matrix, paper_ids, titles, output_path, threshold=0.45)
\ No newline at end of file
+    visualize_similarity_network(similarity_matrix, paper_ids, titles, output_path, threshold=threshold)
\ No newline at end of file
@@ -6,12 +6,11 @@ from bertopic import BERTopic
 import matplotlib.pyplot as plt
 import os
 import pandas as pd
+from pipeline.papers_jsonl import read_papers
 
 def load_papers():
-    """Load paper data from JSON file"""
-    with open(os.path.join("output","papers_with_openalex.json"), "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data["papers"]
+    """Iterate over the papers of the JSON Lines file without loading it whole"""
+    return read_papers(os.path.join("output","papers_with_openalex.jsonl"))
 
 def extract_abstracts(papers):
     """Extract abstracts from papers"""
@@ -134,7 +133,6 @@ def visualize_topics(topic_data, method):
 def create_topic_modeling():
     # Load papers
     papers = load_papers()
-    print(f"Loaded {len(papers)} papers")
     
     # Extract abstracts
     abstracts = extract_abstracts(papers)
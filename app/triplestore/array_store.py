@@ -0,0 +1,233 @@
+import json
+import os
+import shutil
+import sqlite3
+from bisect import bisect_left
+from functools import lru_cache
+from urllib.parse import quote
+import numpy as np
+from rdflib import URIRef
+from rdflib.store import Store, VALID_STORE, NO_STORE
+from triplestore.sqlite_store import NamespaceBindings, encode_term, decode_term
+
+# Read-only snapshot of the knowledge graph served by the API processes
+SNAPSHOT_DIR = "knowledge_graph.snapshot"
+
+# Each permutation of (s, p, o) is stored as a (3, n) array sorted by rows,
+# so that every triple pattern is a range of one of them
+PERMUTATIONS = {"spo": (0, 1, 2), "pos": (1, 2, 0), "osp": (2, 0, 1)}
+CHUNK_SIZE = 4096
+
+def _term_key(kind, value, datatype, lang):
+    """Byte key of a term; the snapshot terms are sorted by it."""
+    return b"%d%s\x00%s\x00%s" % (kind, value.encode("utf-8"), datatype.encode("utf-8"), lang.encode("utf-8"))
+
+def _parse_key(key):
+    head, datatype, lang = key.rsplit(b"\x00", 2)
+    return int(head[:1]), head[1:].decode("utf-8"), datatype.decode("utf-8"), lang.decode("utf-8")
+
+def _bound_prefix(ids, order):
+    """Leading bound ids of a triple pattern in the given column order."""
+    prefix = []
+    for column in order:
+        if ids[column] is None:
+            break
+        prefix.append(ids[column])
+    return prefix
+
+class _TermKeys:
+    """Sequence view of the sorted term keys stored in one blob."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+class ArrayStore(NamespaceBindings, Store):
+    """
+    Read-only rdflib Store over a memory-mapped snapshot of the graph.
+
+    Terms are interned as their rank in a sorted blob, and the triples are
+    kept as SPO, POS and OSP permutations in sorted integer numpy arrays,
+    12 bytes per triple and permutation with 32-bit ids. All files are
+    memory-mapped, so worker processes share the same physical pages and
+    opening a snapshot does not read it. Triple patterns are answered with
+    binary searches on the permutation whose prefix is bound.
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, configuration=None, identifier=None):
+        self.path = None
+        self._namespace = {}
+        self._prefix = {}
+        self.meta = {}
+        super().__init__(configuration, identifier)
+
+    def open(self, configuration, create=False):
+        if create:
+            raise PermissionError("ArrayStore snapshots are read-only; use build_snapshot()")
+        if not os.path.isdir(configuration):
+            return NO_STORE
+        self.path = configuration
+        with open(os.path.join(configuration, "meta.json"), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        self.meta = info["meta"]
+        self.length = info["triples"]
+        for prefix, uri in info["namespaces"].items():
+            self.bind(prefix, URIRef(uri))
+
+        blob_path = os.path.join(configuration, "terms.bin")
+        # numpy cannot map an empty file
+        blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else b""
+        # Plain ndarray views of the mappings skip np.memmap's per-slice overhead
+        load = lambda name: np.asarray(np.load(os.path.join(configuration, f"{name}.npy"), mmap_mode="r"))
+        self.keys = _TermKeys(np.asarray(blob) if len(blob) else blob, load("offsets"))
+        self.perms = {name: load(name) for name in PERMUTATIONS}
+        self._term = lru_cache(maxsize=1 << 16)(self._load_term)
+        self._term_id = lru_cache(maxsize=1 << 16)(self._find_term_id)
+        return VALID_STORE
+
+    def close(self, commit_pending_transaction=False):
+        self.perms = {}
+        if self.path is not None:
+            self._term.cache_clear()
+            self._term_id.cache_clear()
+
+    def _load_term(self, term_id):
+        return decode_term(*_parse_key(self.keys[term_id]))
+
+    def term_id(self, term):
+        """Id of an rdflib term in the snapshot, or None if it does not occur."""
+        return self._term_id(encode_term(term))
+
+    def _find_term_id(self, row):
+        key = _term_key(*row)
+        i = bisect_left(self.keys, key)
+        return i if i < len(self.keys) and self.keys[i] == key else None
+
+    def _range(self, name, bound):
+        """[lo, hi) range of permutation ``name`` whose first columns equal ``bound``."""
+        perm = self.perms[name]
+        lo, hi = 0, perm.shape[1]
+        for column, value in enumerate(bound):
+            values = perm[column, lo:hi]
+            # A needle of another dtype would make numpy cast the whole range
+            value = perm.dtype.type(value)
+            lo, hi = lo + int(np.searchsorted(values, value, "left")), lo + int(np.searchsorted(values, value, "right"))
+            if lo == hi:
+                break
+        return lo, hi
+
+    def triples(self, triple_pattern, context=None):
+        ids = []
+        for term in triple_pattern:
+            if term is None:
+                ids.append(None)
+                continue
+            term_id = self.term_id(term)
+            if term_id is None:
+                return
+            ids.append(term_id)
+
+        # Permutation whose leading columns cover every bound position
+        name, bound = max(((name, _bound_prefix(ids, order)) for name, order in PERMUTATIONS.items()),
+                          key=lambda candidate: len(candidate[1]))
+        lo, hi = self._range(name, bound)
+        perm = self.perms[name]
+        order = PERMUTATIONS[name]
+        term = self._term
+        for start in range(lo, hi, CHUNK_SIZE):
+            chunk = perm[:, start:min(start + CHUNK_SIZE, hi)].tolist()
+            for row in zip(*chunk):
+                triple = [None, None, None]
+                for position, term_id in zip(order, row):
+                    triple[position] = term(term_id)
+                yield tuple(triple), iter(())
+
+    def __len__(self, context=None):
+        return self.length
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def add(self, triple, context=None, quoted=False):
+        raise PermissionError("ArrayStore snapshots are read-only")
+
+    def remove(self, triple_pattern, context=None):
+        raise PermissionError("ArrayStore snapshots are read-only")
+
+def build_snapshot(db_path, snapshot_path, chunk_size=1 << 20):
+    """
+    Write an ArrayStore snapshot of the SQLite store at ``db_path``.
+
+    The snapshot is written to a new directory that then replaces
+    ``snapshot_path``; processes that have the previous snapshot mapped keep
+    reading it. Returns the number of triples.
+    """
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True)
+
+    # Terms sorted by key; their rank is their id in the snapshot
+    rows = conn.execute("SELECT id, kind, value, datatype, lang FROM terms").fetchall()
+    keys = [_term_key(*row[1:]) for row in rows]
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    dtype = np.int32 if len(keys) < 2 ** 31 else np.int64
+    remap = np.zeros(max((row[0] for row in rows), default=0) + 1, dtype=dtype)
+    remap[np.array([rows[i][0] for i in order], dtype=np.int64)] = np.arange(len(order), dtype=dtype)
+    del rows
+
+    tmp_path = snapshot_path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    with open(os.path.join(tmp_path, "terms.bin"), "wb") as f:
+        position = 0
+        for rank, i in enumerate(order):
+            f.write(keys[i])
+            position += len(keys[i])
+            offsets[rank + 1] = position
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+    del keys, order
+
+    # Triples as snapshot ids, read in chunks
+    chunks = []
+    cursor = conn.execute("SELECT s, p, o FROM triples")
+    while True:
+        batch = cursor.fetchmany(chunk_size)
+        if not batch:
+            break
+        chunks.append(remap[np.array(batch, dtype=np.int64)])
+    triples = np.concatenate(chunks) if chunks else np.zeros((0, 3), dtype=dtype)
+    del chunks
+
+    for name, columns in PERMUTATIONS.items():
+        # lexsort sorts by the last key first
+        permuted = triples[:, columns]
+        sort = np.lexsort(permuted.T[::-1])
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(permuted[sort].T))
+
+    info = {
+        "triples": int(len(triples)),
+        "namespaces": dict(conn.execute("SELECT prefix, uri FROM namespaces")),
+        "meta": dict(conn.execute("SELECT key, value FROM meta")),
+    }
+    conn.close()
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+
+    # Swap the directories; the old files stay readable while mapped
+    old_path = snapshot_path + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(snapshot_path):
+        os.rename(snapshot_path, old_path)
+    os.rename(tmp_path, snapshot_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return info["triples"]
@@ -0,0 +1,94 @@
+import hashlib
+import os
+import shutil
+from rdflib.namespace import OWL
+from enrich.json_to_rdf import graph_version, delta_paths, delta_versions
+from triplestore.sqlite_store import SQLiteStore, build_store, parse_ntriples
+from triplestore.array_store import build_snapshot
+
+# Prefixes bound in the store, available to SPARQL queries without PREFIX
+NAMESPACES = {
+    "dcterms": "http://purl.org/dc/terms/",
+    "foaf": "http://xmlns.com/foaf/0.1/",
+    "bibo": "http://purl.org/ontology/bibo/",
+    "skos": "http://www.w3.org/2004/02/skos/core#",
+    "owl": "http://www.w3.org/2002/07/owl#",
+    "ex": "http://example.org/resource/",
+    "wd": "http://www.wikidata.org/entity/",
+}
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _replace_same_as(store, sameas_path):
+    # The base graph has no owl:sameAs triples: all of them come from the delta
+    store.remove((None, OWL.sameAs, None))
+    parse_ntriples(sameas_path, store.add_triples)
+
+def update_store(db_path, base_path, sameas_path):
+    """
+    Bring the SQLite store at ``db_path`` up to date with the pipeline graph.
+
+    The store records the version of the base graph it holds. If it is the
+    version the last incremental update of the graph started from, only the
+    retracted and inserted triples are applied; if it is already current,
+    only the Wikidata links are replaced. Otherwise the store is rebuilt.
+    Updates are made on a copy that replaces the store when complete, so the
+    services keep reading the previous one meanwhile.
+    """
+    for path in (base_path, sameas_path):
+        if not os.path.exists(path):
+            print(f"❌ Error: can't open file {path}")
+            return 1
+
+    version = graph_version(base_path)
+    sameas = _file_sha256(sameas_path)
+    meta = {"version": version, "sameas": sameas}
+
+    stored_version = stored_sameas = None
+    if os.path.exists(db_path):
+        store = SQLiteStore(db_path)
+        stored_version, stored_sameas = store.get_meta("version"), store.get_meta("sameas")
+        store.close()
+
+    deltas = delta_versions(base_path)
+    if version is not None and stored_version == version:
+        if stored_sameas == sameas:
+            print(f"✅ Triple store '{db_path}' is up to date")
+            return 0
+        apply_delta = False
+    elif version is not None and deltas is not None and deltas == (stored_version, version):
+        apply_delta = True
+    else:
+        count = build_store(db_path, [base_path, sameas_path], NAMESPACES, meta)
+        print(f"✅ Triple store built in '{db_path}' with {count} triples")
+        return 0
+
+    tmp_path = db_path + ".tmp"
+    shutil.copyfile(db_path, tmp_path)
+    store = SQLiteStore()
+    store.open(tmp_path, create=True)
+    if apply_delta:
+        added_path, removed_path = delta_paths(base_path)
+        parse_ntriples(removed_path, store.remove_triples)
+        parse_ntriples(added_path, store.add_triples)
+    _replace_same_as(store, sameas_path)
+    for key, value in meta.items():
+        store.set_meta(key, value)
+    store.close()
+    os.replace(tmp_path, db_path)
+    print(f"✅ Triple store '{db_path}' updated")
+    return 0
+
+def update_snapshot(db_path, snapshot_path):
+    """Write the read-only serving snapshot of the SQLite store at ``db_path``."""
+    if not os.path.exists(db_path):
+        print(f"❌ Error: can't open file {db_path}")
+        return 1
+    count = build_snapshot(db_path, snapshot_path)
+    print(f"✅ Graph snapshot with {count} triples saved to '{snapshot_path}'")
+    return 0
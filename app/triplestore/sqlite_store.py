@@ -0,0 +1,345 @@
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from urllib.parse import quote
+from rdflib import BNode, Literal, URIRef
+from rdflib.store import Store, VALID_STORE, NO_STORE
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+
+# Knowledge graph store written by the pipeline and opened by the API services
+SQLITE_STORE_FILE = "knowledge_graph.sqlite"
+
+URI, LITERAL, BNODE = 0, 1, 2
+BATCH_SIZE = 10000
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS terms (
+        id INTEGER PRIMARY KEY,
+        kind INTEGER NOT NULL,
+        value TEXT NOT NULL,
+        datatype TEXT NOT NULL DEFAULT '',
+        lang TEXT NOT NULL DEFAULT '',
+        UNIQUE (value, kind, datatype, lang)
+    );
+    CREATE TABLE IF NOT EXISTS triples (
+        s INTEGER NOT NULL,
+        p INTEGER NOT NULL,
+        o INTEGER NOT NULL,
+        PRIMARY KEY (s, p, o)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS namespaces (prefix TEXT PRIMARY KEY, uri TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+# Together with the primary key (s, p, o), every triple pattern has an index
+_INDEXES = """
+    CREATE INDEX IF NOT EXISTS triples_pos ON triples (p, o, s);
+    CREATE INDEX IF NOT EXISTS triples_osp ON triples (o, s, p);
+"""
+
+_SELECT_TRIPLES = """
+    SELECT a.kind, a.value, a.datatype, a.lang,
+           b.kind, b.value, b.datatype, b.lang,
+           c.kind, c.value, c.datatype, c.lang
+    FROM triples t
+    JOIN terms a ON a.id = t.s
+    JOIN terms b ON b.id = t.p
+    JOIN terms c ON c.id = t.o
+"""
+
+def encode_term(term):
+    """Return the (kind, value, datatype, lang) row of an rdflib term."""
+    if isinstance(term, Literal):
+        return LITERAL, str(term), str(term.datatype or ""), term.language or ""
+    if isinstance(term, BNode):
+        return BNODE, str(term), "", ""
+    return URI, str(term), "", ""
+
+@lru_cache(maxsize=1 << 16)
+def decode_term(kind, value, datatype, lang):
+    """Build the rdflib term of a terms row; terms are immutable and shared."""
+    if kind == LITERAL:
+        return Literal(value, lang=lang or None, datatype=URIRef(datatype) if datatype else None)
+    if kind == BNODE:
+        return BNode(value)
+    return URIRef(value)
+
+def _coalesce(*values, default=None):
+    for value in values:
+        if value is not None:
+            return value
+    return default
+
+class NamespaceBindings:
+    """Namespace bindings kept in memory, with the semantics of rdflib's Memory store."""
+
+    def bind(self, prefix, namespace, override=True):
+        bound_namespace = self._namespace.get(prefix)
+        bound_prefix = _coalesce(self._prefix.get(namespace), self._prefix.get(bound_namespace))
+        if override:
+            if bound_prefix is not None:
+                del self._namespace[bound_prefix]
+            if bound_namespace is not None:
+                del self._prefix[bound_namespace]
+            self._prefix[namespace] = prefix
+            self._namespace[prefix] = namespace
+        else:
+            self._prefix[_coalesce(bound_namespace, namespace)] = _coalesce(bound_prefix, default=prefix)
+            self._namespace[_coalesce(bound_prefix, prefix)] = _coalesce(bound_namespace, default=namespace)
+
+    def namespace(self, prefix):
+        return self._namespace.get(prefix)
+
+    def prefix(self, namespace):
+        return self._prefix.get(namespace)
+
+    def namespaces(self):
+        yield from self._namespace.items()
+
+class SQLiteStore(NamespaceBindings, Store):
+    """
+    rdflib Store kept in an indexed SQLite database.
+
+    Terms are interned in a ``terms`` table and triples are stored as term
+    ids with SPO, POS and OSP indexes, so any triple pattern is an index
+    lookup and opening the store does not load the graph. Graph(store=...)
+    runs the usual SPARQL queries on top of it.
+
+    ``open(path)`` opens the database read-only, with one connection per
+    thread; ``open(path, create=True)`` opens it for writing, creating the
+    schema if needed. The store is not context aware: it holds one graph.
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, configuration=None, identifier=None):
+        self.path = None
+        self.read_only = True
+        self._writer = None
+        self._local = threading.local()
+        # Read connections of every thread, closed together by close()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._namespace = {}
+        self._prefix = {}
+        super().__init__(configuration, identifier)
+
+    def open(self, configuration, create=False):
+        self.path = configuration
+        self.read_only = not create
+        if self.read_only:
+            # The database of a read-only store does not change under it. The
+            # cache belongs to the instance, so a closed store can be freed
+            self._cached_term_id = lru_cache(maxsize=1 << 16)(self._lookup_term_id)
+            if not os.path.exists(configuration):
+                return NO_STORE
+            conn = self._conn()
+        else:
+            os.makedirs(os.path.dirname(configuration) or ".", exist_ok=True)
+            self._writer = conn = sqlite3.connect(configuration)
+            conn.executescript(_SCHEMA + _INDEXES)
+        for prefix, uri in conn.execute("SELECT prefix, uri FROM namespaces"):
+            self._namespace[prefix] = URIRef(uri)
+            self._prefix[URIRef(uri)] = prefix
+        return VALID_STORE
+
+    def _conn(self):
+        if not self.read_only:
+            return self._writer
+        conn = getattr(self._local, "conn", None)
+        # A connection must not be used across fork(): forked workers open their own
+        if conn is None or self._local.pid != os.getpid():
+            uri = f"file:{quote(os.path.abspath(self.path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            # Reads go through the OS page cache, shared by every process
+            conn.execute("PRAGMA mmap_size = 1073741824")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            with self._connections_lock:
+                self._connections.append((conn, os.getpid()))
+        return conn
+
+    def close(self, commit_pending_transaction=False):
+        if self._writer is not None:
+            self.commit()
+            self._writer.close()
+            self._writer = None
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn, pid in connections:
+            # Connections inherited over fork() belong to the parent process
+            if pid == os.getpid():
+                conn.close()
+        self._local = threading.local()
+        if self.read_only and self.path is not None:
+            self._cached_term_id.cache_clear()
+
+    def commit(self):
+        if self.read_only:
+            return
+        self._writer.execute("DELETE FROM namespaces")
+        self._writer.executemany("INSERT INTO namespaces VALUES (?, ?)",
+                                 [(prefix, str(uri)) for prefix, uri in self._namespace.items()])
+        self._writer.execute("INSERT OR REPLACE INTO meta VALUES ('triples', (SELECT COUNT(*) FROM triples))")
+        self._writer.commit()
+
+    def get_meta(self, key):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self._writer.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    # Terms
+
+    def _term_id(self, term):
+        if self.read_only:
+            return self._cached_term_id(encode_term(term))
+        return self._lookup_term_id(encode_term(term))
+
+    def _lookup_term_id(self, row):
+        found = self._conn().execute(
+            "SELECT id FROM terms WHERE value = ? AND kind = ? AND datatype = ? AND lang = ?",
+            (row[1], row[0], row[2], row[3])
+        ).fetchone()
+        return found[0] if found else None
+
+    def _add_term(self, term):
+        row = encode_term(term)
+        term_id = self._lookup_term_id(row)
+        if term_id is None:
+            term_id = self._writer.execute(
+                "INSERT INTO terms (kind, value, datatype, lang) VALUES (?, ?, ?, ?)", row
+            ).lastrowid
+        return term_id
+
+    def _pattern(self, triple_pattern, table="t."):
+        """SQL conditions for a triple pattern, or None if a term is unknown."""
+        conditions, params = [], []
+        for column, term in zip((table + "s", table + "p", table + "o"), triple_pattern):
+            if term is None:
+                continue
+            term_id = self._term_id(term)
+            if term_id is None:
+                return None
+            conditions.append(f"{column} = ?")
+            params.append(term_id)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    # Store interface
+
+    def add(self, triple, context=None, quoted=False):
+        if self.read_only:
+            raise PermissionError(f"{self.path} is opened read-only")
+        s, p, o = (self._add_term(term) for term in triple)
+        self._writer.execute("INSERT OR IGNORE INTO triples VALUES (?, ?, ?)", (s, p, o))
+        super().add(triple, context, quoted)
+
+    def remove(self, triple_pattern, context=None):
+        if self.read_only:
+            raise PermissionError(f"{self.path} is opened read-only")
+        pattern = self._pattern(triple_pattern, table="")
+        if pattern is not None:
+            where, params = pattern
+            self._writer.execute("DELETE FROM triples" + where, params)
+        super().remove(triple_pattern, context)
+
+    def add_triples(self, triples):
+        for triple in triples:
+            self.add(triple)
+
+    def remove_triples(self, triples):
+        for triple in triples:
+            self.remove(triple)
+
+    def triples(self, triple_pattern, context=None):
+        pattern = self._pattern(triple_pattern)
+        if pattern is None:
+            return
+        where, params = pattern
+        for row in self._conn().execute(_SELECT_TRIPLES + where, params):
+            yield (decode_term(*row[0:4]), decode_term(*row[4:8]), decode_term(*row[8:12])), iter(())
+
+    def __len__(self, context=None):
+        count = self.get_meta("triples")
+        if count is None or not self.read_only:
+            return self._conn().execute("SELECT COUNT(*) FROM triples").fetchone()[0]
+        return int(count)
+
+    def contexts(self, triple=None):
+        return iter(())
+
+class _TripleSink:
+    """N-Triples parser sink that hands triples to a callback in batches."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.batch = []
+        self.count = 0
+
+    def triple(self, s, p, o):
+        self.batch.append((s, p, o))
+        if len(self.batch) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.callback(self.batch)
+        self.count += len(self.batch)
+        self.batch = []
+
+def parse_ntriples(path, callback):
+    """Stream the triples of an N-Triples file to ``callback`` in batches."""
+    sink = _TripleSink(callback)
+    with open(path, "r", encoding="utf-8") as f:
+        W3CNTriplesParser(sink).parse(f)
+    sink.flush()
+    return sink.count
+
+def build_store(db_path, rdf_files, namespaces=None, meta=None):
+    """
+    Build a new store at ``db_path`` from N-Triples files.
+
+    The database is written next to ``db_path`` and moved into place when
+    complete, so services that have the previous one open keep reading it.
+    The secondary indexes are created after loading. Returns the number of
+    triples in the store.
+    """
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.executescript(_SCHEMA)
+
+    term_ids = {}
+
+    def term_id(term, new_terms):
+        row = encode_term(term)
+        found = term_ids.get(row)
+        if found is None:
+            found = term_ids[row] = len(term_ids) + 1
+            new_terms.append((found,) + row)
+        return found
+
+    def insert(batch):
+        new_terms = []
+        rows = [(term_id(s, new_terms), term_id(p, new_terms), term_id(o, new_terms)) for s, p, o in batch]
+        conn.executemany("INSERT INTO terms VALUES (?, ?, ?, ?, ?)", new_terms)
+        conn.executemany("INSERT OR IGNORE INTO triples VALUES (?, ?, ?)", rows)
+
+    for path in rdf_files:
+        parse_ntriples(path, insert)
+    conn.executescript(_INDEXES)
+    conn.executemany("INSERT INTO namespaces VALUES (?, ?)", (namespaces or {}).items())
+    conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", (meta or {}).items())
+    conn.execute("INSERT OR REPLACE INTO meta VALUES ('triples', (SELECT COUNT(*) FROM triples))")
+    conn.execute("ANALYZE")
+    conn.commit()
+    count = conn.execute("SELECT COUNT(*) FROM triples").fetchone()[0]
+    conn.close()
+    os.replace(tmp_path, db_path)
+    return count
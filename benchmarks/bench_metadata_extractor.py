@@ -0,0 +1,164 @@
+"""
+Benchmark of the GROBID TEI metadata extraction.
+
+Compares the original extractor (a dozen descendant searches over the whole
+document, one paper at a time) with extract_paper_metadata, run through
+iter_papers_metadata serially and on a process pool, over synthetic
+GROBID-like TEI documents. It also checks that both produce the same records.
+
+Usage (from the repository root):
+    python benchmarks/bench_metadata_extractor.py [n_docs] [n_references]
+"""
+import os
+import random
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from grobid.metadata_extractor import iter_papers_metadata
+
+TEI_NS = "http://www.tei-c.org/ns/1.0"
+
+def make_tei(i, n_references, rng):
+    """Build a synthetic TEI document shaped like GROBID output."""
+    has_doi = rng.random() < 0.6
+    has_abstract = rng.random() < 0.9
+    title = f"Paper {i}" if rng.random() < 0.98 else ""
+    authors = "".join(
+        f'<author><persName><forename type="first">First{a}</forename>'
+        f'<surname>Last{i}_{a}</surname></persName></author>'
+        for a in range(rng.randint(1, 6))
+    )
+    doi = f'<idno type="DOI">10.1000/paper.{i}</idno>' if has_doi else ""
+    abstract = (
+        f"<abstract><div><p>We introduce method {i} for robotics and more.</p></div></abstract>"
+        if has_abstract else "<abstract></abstract>"
+    )
+    body = "".join(
+        f"<div><head>Section {s}</head><p>Paragraph {s} of paper {i}. " + "text " * 80 + "</p></div>"
+        for s in range(30)
+    )
+    references = "".join(
+        f'<biblStruct><analytic><title level="a" type="main">Reference {r}</title>'
+        f'<author><persName><forename type="first">Ref</forename><surname>Author{r}</surname></persName></author>'
+        f'</analytic><monogr><title level="j">Journal {r}</title>'
+        f'<imprint><date type="published" when="20{r % 25:02d}"/></imprint></monogr>'
+        f'<idno type="DOI">10.2000/ref.{i}.{r}</idno></biblStruct>'
+        for r in range(n_references)
+    )
+    return (
+        f'<TEI xmlns="{TEI_NS}"><teiHeader><fileDesc>'
+        f'<titleStmt><title level="a" type="main">{title}</title></titleStmt>'
+        f'<publicationStmt><publisher/><date type="published" when="2021-03-01">2021</date></publicationStmt>'
+        f'<sourceDesc><biblStruct><analytic>{authors}<title level="a" type="main">{title}</title></analytic>'
+        f'<monogr><title level="j" type="main">Journal of Tests</title><imprint/></monogr>{doi}'
+        f'</biblStruct></sourceDesc></fileDesc>'
+        f'<profileDesc>{abstract}</profileDesc></teiHeader>'
+        f'<text><body>{body}</body><back><div type="references"><listBibl>{references}'
+        f'</listBibl></div></back></text></TEI>'
+    )
+
+def legacy_extract(filename, xml_text):
+    """The original per-paper extraction, kept here as the baseline."""
+    try:
+        xml_text = xml_text.replace("&", "&amp;").replace("<abstract></abstract>", "<abstract/>")
+        root = ET.fromstring(xml_text)
+        ns = {'tei': TEI_NS}
+        title = (root.findtext('.//tei:titleStmt/tei:title', namespaces=ns) or
+                 root.findtext('.//tei:analytic/tei:title[@level="a"][@type="main"]', namespaces=ns) or
+                 root.findtext('.//tei:analytic/tei:title', namespaces=ns) or
+                 root.findtext('.//tei:body//tei:p[contains(text(), "Robotics")]', namespaces=ns) or "")
+        publicationYear = ""
+        date_elem = root.find('.//tei:publicationStmt/tei:date[@type="published"]', namespaces=ns)
+        if date_elem is not None:
+            match = re.search(r'(19|20)\d{2}', date_elem.attrib.get('when', ''))
+            if match:
+                publicationYear = match.group(0)
+        if not publicationYear:
+            date_elem = root.find('.//tei:imprint/tei:date[@type="published"]', namespaces=ns)
+            if date_elem is not None:
+                match = re.search(r'(19|20)\d{2}', date_elem.attrib.get('when', ''))
+                if match:
+                    publicationYear = match.group(0)
+        publishedIn = (
+            root.findtext('.//tei:monogr/tei:title[@level="j"][@type="main"]', namespaces=ns) or
+            root.findtext('.//tei:monogr/tei:title[@level="j"]', namespaces=ns) or
+            root.findtext('.//tei:monogr/tei:meeting', namespaces=ns) or
+            ""
+        )
+        doi = root.findtext('.//tei:idno[@type="DOI"]', namespaces=ns) or ""
+        if not doi:
+            arxiv_id = root.findtext('.//tei:idno[@type="arXiv"]', namespaces=ns)
+            if arxiv_id:
+                doi = f"arXiv:{arxiv_id}"
+        abstract = ""
+        abstract_elem = root.find('.//tei:profileDesc/tei:abstract/tei:p', namespaces=ns)
+        if abstract_elem is not None and abstract_elem.text:
+            abstract = abstract_elem.text
+        if not abstract:
+            abstract_div = root.find('.//tei:profileDesc/tei:abstract/tei:div/tei:p', namespaces=ns)
+            if abstract_div is not None and abstract_div.text:
+                abstract = abstract_div.text
+        if not abstract:
+            abstract_elem = root.find('.//tei:profileDesc/tei:abstract', namespaces=ns)
+            if abstract_elem is not None:
+                abstract = ''.join(abstract_elem.itertext()).strip()
+        if not abstract:
+            body_paragraphs = root.findall('.//tei:body//tei:p', namespaces=ns)
+            for p in body_paragraphs:
+                p_text = p.text if p.text else ""
+                if p_text and (p_text.startswith('Abstract') or p_text.strip().startswith('Abstract')):
+                    abstract = p_text
+                    break
+            if not abstract:
+                for p in body_paragraphs[:5]:
+                    p_text = ''.join(p.itertext()) if p is not None else ""
+                    if len(p_text) > 100 and ("we" in p_text.lower() or "introduce" in p_text.lower()):
+                        abstract = p_text
+                        break
+        authors = []
+        for author_elem in root.findall('.//tei:sourceDesc/tei:biblStruct/tei:analytic/tei:author', namespaces=ns):
+            persName = author_elem.find('./tei:persName', namespaces=ns)
+            if persName is not None:
+                firstname = persName.findtext('./tei:forename[@type="first"]', namespaces=ns) or ""
+                middlename = persName.findtext('./tei:forename[@type="middle"]', namespaces=ns) or ""
+                surname = persName.findtext('./tei:surname', namespaces=ns) or ""
+                if firstname or surname:
+                    authors.append({"firstname": firstname, "middlename": middlename, "lastname": surname})
+        return {
+            "filename": filename, "title": title, "authors": authors,
+            "publicationYear": publicationYear, "publishedIn": publishedIn,
+            "doi": doi, "abstract": abstract
+        }
+    except Exception:
+        return None
+
+def timed(label, n_docs, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.2f}s {n_docs / elapsed:10.1f} docs/s")
+    return result
+
+def main():
+    n_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    n_references = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    rng = random.Random(42)
+    papers = {f"paper{i:06d}.pdf": make_tei(i, n_references, rng) for i in range(n_docs)}
+    print(f"{n_docs} synthetic TEI documents, {n_references} references each\n")
+
+    before = timed("before (serial)", n_docs,
+                   lambda: [legacy_extract(f, x) for f, x in papers.items()])
+    after = timed("after (serial)", n_docs,
+                  lambda: [r[1] for r in iter_papers_metadata(papers, workers=1)])
+    pooled = timed(f"after ({os.cpu_count()} processes)", n_docs,
+                   lambda: [r[1] for r in iter_papers_metadata(papers)])
+
+    assert before == after == pooled, "extractors disagree"
+    print("\nAll extractors produced identical records")
+
+if __name__ == "__main__":
+    main()
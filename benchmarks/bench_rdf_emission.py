@@ -0,0 +1,86 @@
+"""
+Benchmark of the RDF emission between the rdf and wikidata stages.
+
+Compares the original hand-off (build an rdflib Graph, serialize it to
+Turtle, parse the Turtle back in the wikidata stage) with the streaming
+N-Triples writer and N-Triples parsing, over synthetic enriched papers. It
+also checks that both produce the same graph.
+
+Usage (from the repository root):
+    python benchmarks/bench_rdf_emission.py [n_papers ...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from rdflib import Graph
+from rdflib.compare import isomorphic
+
+from enrich.json_to_rdf import papers_to_graph, write_ntriples
+
+TOPICS = [f"Topic {t} of {field}" for field in ("robotics", "vision", "language", "biology") for t in range(500)]
+
+def make_papers(n, rng):
+    """Build synthetic papers shaped like papers_with_openalex.jsonl records."""
+    for i in range(n):
+        yield {
+            "filename": f"paper{i}.pdf",
+            "title": f"Paper {i}: a \"quoted\" study of method {i}",
+            "authors": [
+                {"firstname": f"First{a}", "middlename": "", "lastname": f"Last{i}_{a}"}
+                for a in range(rng.randint(1, 6))
+            ],
+            "publicationYear": str(1990 + i % 35),
+            "publishedIn": f"Journal {i % 200}",
+            "doi": f"10.1000/paper.{i}" if rng.random() < 0.6 else "",
+            "abstract": "",
+            "openalex_topics": rng.sample(TOPICS, rng.randint(0, 3)),
+        }
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def bench(n, tmp_dir):
+    papers = list(make_papers(n, random.Random(n)))
+    ttl_path = os.path.join(tmp_dir, f"papers_{n}.ttl")
+    nt_path = os.path.join(tmp_dir, f"papers_{n}.nt")
+
+    def turtle_emit():
+        papers_to_graph(papers).serialize(ttl_path, format="turtle")
+
+    def nt_emit():
+        with open(nt_path, "w", encoding="utf-8") as f:
+            return write_ntriples(papers, f)
+
+    def parse(path, fmt):
+        g = Graph()
+        g.parse(path, format=fmt)
+        return g
+
+    _, ttl_write = timed(turtle_emit)
+    ttl_graph, ttl_read = timed(lambda: parse(ttl_path, "turtle"))
+    triples, nt_write = timed(nt_emit)
+    nt_graph, nt_read = timed(lambda: parse(nt_path, "nt"))
+
+    if len(ttl_graph) != len(nt_graph) or (n <= 2000 and not isomorphic(ttl_graph, nt_graph)):
+        raise SystemExit(f"❌ Graphs differ for {n} papers")
+
+    print(f"{n:>8} papers {len(nt_graph):>9} triples | "
+          f"turtle write {ttl_write:7.2f}s read {ttl_read:7.2f}s | "
+          f"n-triples write {nt_write:6.2f}s read {nt_read:7.2f}s | "
+          f"speedup write x{ttl_write / nt_write:.1f} total x{(ttl_write + ttl_read) / (nt_write + nt_read):.1f}")
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n in sizes:
+            bench(n, tmp_dir)
+
+if __name__ == "__main__":
+    main()
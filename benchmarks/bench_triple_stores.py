@@ -0,0 +1,121 @@
+"""
+Benchmark of the triple stores the API can serve the knowledge graph from.
+
+Builds a synthetic graph, then opens it in a fresh process with each
+backend (rdflib's in-memory store parsing the N-Triples file, the SQLite
+store and the memory-mapped array snapshot) and reports the time to open
+it, the resident memory and the latency of triple lookups and SPARQL
+queries.
+
+Usage (from the repository root):
+    python benchmarks/bench_triple_stores.py [n_papers] [work_dir]
+"""
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from rdflib import Graph, Literal
+from rdflib.namespace import DCTERMS
+
+from bench_rdf_emission import make_papers
+from triplestore.sqlite_store import SQLiteStore, build_store
+from triplestore.array_store import ArrayStore, build_snapshot
+from triplestore.loader import NAMESPACES
+from enrich.json_to_rdf import write_ntriples, BIBO
+
+BACKENDS = ("memory", "sqlite", "array")
+
+QUERIES = {
+    "paper by DOI": """
+        SELECT ?a ?n WHERE { ?p bibo:doi "10.1000/paper.%d" ; dcterms:creator ?a . ?a foaf:name ?n }
+    """,
+    "papers of a topic": """
+        SELECT ?p ?title WHERE { ?p dcterms:subject <http://example.org/topic/Topic_%d_of_vision> ; dcterms:title ?title }
+    """,
+}
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def build(n, work_dir):
+    os.makedirs(work_dir, exist_ok=True)
+    nt_path = os.path.join(work_dir, "graph.nt")
+    db_path = os.path.join(work_dir, "graph.sqlite")
+    snapshot_path = os.path.join(work_dir, "graph.snapshot")
+    if not os.path.exists(snapshot_path):
+        start = time.perf_counter()
+        with open(nt_path, "w", encoding="utf-8") as f:
+            write_ntriples(make_papers(n, random.Random(n)), f)
+        build_store(db_path, [nt_path], NAMESPACES)
+        sqlite_time = time.perf_counter() - start
+        start = time.perf_counter()
+        build_snapshot(db_path, snapshot_path)
+        print(f"built {n} papers: SQLite store {sqlite_time:.1f}s, snapshot {time.perf_counter() - start:.1f}s")
+    return nt_path, db_path, snapshot_path
+
+def open_graph(backend, nt_path, db_path, snapshot_path):
+    if backend == "memory":
+        graph = Graph()
+        for prefix, namespace in NAMESPACES.items():
+            graph.bind(prefix, namespace)
+        graph.parse(nt_path, format="nt")
+        return graph
+    if backend == "sqlite":
+        return Graph(store=SQLiteStore(db_path))
+    return Graph(store=ArrayStore(snapshot_path))
+
+def measure(backend, nt_path, db_path, snapshot_path, n):
+    """Run in a child process: open the graph with one backend and time lookups."""
+    baseline = rss_mb()
+    start = time.perf_counter()
+    graph = open_graph(backend, nt_path, db_path, snapshot_path)
+    result = {"open_s": time.perf_counter() - start, "triples": len(graph)}
+    result["rss_open_mb"] = rss_mb() - baseline
+
+    rng = random.Random(0)
+    lookups = [Literal(f"10.1000/paper.{rng.randrange(n)}") for _ in range(2000)]
+    start = time.perf_counter()
+    for doi in lookups:
+        for paper in graph.subjects(BIBO.doi, doi):
+            list(graph.objects(paper, DCTERMS.creator))
+    result["lookup_ms"] = (time.perf_counter() - start) / len(lookups) * 1000
+
+    for name, query in QUERIES.items():
+        start = time.perf_counter()
+        for i in range(20):
+            list(graph.query(query % rng.randrange(n if "DOI" in name else 500)))
+        result[f"{name}_ms"] = (time.perf_counter() - start) / 20 * 1000
+    result["rss_after_mb"] = rss_mb() - baseline
+    return result
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        backend, nt_path, db_path, snapshot_path, n = sys.argv[2:]
+        print(json.dumps(measure(backend, nt_path, db_path, snapshot_path, int(n))))
+        return
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    work_dir = sys.argv[2] if len(sys.argv) > 2 else tempfile.mkdtemp()
+    paths = build(n, work_dir)
+    print(f"{'backend':>8} {'open':>8} {'RSS open':>9} {'RSS after':>10} {'lookup':>9} " +
+          " ".join(f"{name:>18}" for name in QUERIES))
+    for backend in BACKENDS:
+        output = subprocess.run([sys.executable, __file__, "--child", backend, *paths, str(n)],
+                                check=True, capture_output=True, text=True).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(f"{backend:>8} {r['open_s']:7.2f}s {r['rss_open_mb']:7.0f}MB {r['rss_after_mb']:8.0f}MB "
+              f"{r['lookup_ms']:7.3f}ms " + " ".join(f"{r[name + '_ms']:16.1f}ms" for name in QUERIES))
+
+if __name__ == "__main__":
+    main()
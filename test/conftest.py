@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, os.path.join(ROOT, "api"))
+
+# Script run by hand against a running endpoint
+collect_ignore = ["test_sparql.py"]
+
+# Papers of the output folder the services are tested on
+PAPERS = 5
+
+def write_output(output_folder, papers=PAPERS):
+    """Write a pipeline output folder with ``papers`` papers, one topic and their neighbour lists"""
+    from similarity.neighbors import NEIGHBORS_DIR, save_neighbors
+
+    ex = "http://example.org/resource/"
+    lines = [f'<{ex}topic1> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> '
+             f'<http://www.w3.org/2004/02/skos/core#Concept> .',
+             f'<{ex}topic1> <http://www.w3.org/2004/02/skos/core#prefLabel> "Topic 1" .']
+    for i in range(papers):
+        lines.append(f'<{ex}paper{i}> <http://purl.org/dc/terms/title> "Paper {i}" .')
+        lines.append(f'<{ex}paper{i}> <http://purl.org/dc/terms/subject> <{ex}topic1> .')
+    with open(os.path.join(output_folder, "papers_with_topics.nt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    embeddings = np.random.default_rng(0).normal(size=(papers, 8))
+    save_neighbors(os.path.join(output_folder, NEIGHBORS_DIR), [f"paper{i}" for i in range(papers)], embeddings)
+
+# The services load their graph when they are imported
+_output_folder = tempfile.mkdtemp(prefix="graph-output-")
+write_output(_output_folder)
+os.environ["GRAPH_OUTPUT_FOLDER"] = _output_folder
+os.environ["GRAPH_RELOAD_INTERVAL"] = "0"
+
+@pytest.fixture
+def app():
+    from wsgi import create_app
+    return create_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,15 @@
+import admin
+
+def test_admin_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+    assert client.get("/admin/graph").status_code == 403
+    assert client.post("/admin/reload").status_code == 403
+    assert client.get("/admin/graph", headers={"Authorization": "Bearer "}).status_code == 403
+
+def test_admin_requires_token(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    assert client.get("/admin/graph").status_code == 401
+    assert client.get("/admin/graph", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/admin/graph", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert response.get_json()["reloads"] == 0
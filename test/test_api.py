@@ -0,0 +1,38 @@
+from conftest import PAPERS
+
+def test_similar_papers_of_small_corpus(client):
+    # A corpus of PAPERS papers keeps PAPERS - 1 neighbours per paper
+    response = client.get("/api/papers/paper0/similar")
+    assert response.status_code == 200
+    papers = response.get_json()["papers"]
+    assert len(papers) == PAPERS - 1
+    assert "paper0" not in [paper["id"] for paper in papers]
+
+    # A larger k is clamped to the stored lists
+    response = client.get("/api/papers/paper0/similar?k=50")
+    assert response.status_code == 200
+    assert len(response.get_json()["papers"]) == PAPERS - 1
+
+    response = client.get("/api/papers/paper0/similar?k=2")
+    assert [paper["score"] for paper in response.get_json()["papers"]] == \
+        [paper["score"] for paper in papers[:2]]
+
+def test_similar_papers_of_single_paper_corpus(client, monkeypatch, tmp_path):
+    from conftest import write_output
+    from shared_graph import served_state
+    from similarity.neighbors import NEIGHBORS_DIR, PaperNeighbors
+
+    write_output(str(tmp_path), papers=1)
+    with client.application.test_request_context():
+        derived = served_state().derived
+    monkeypatch.setitem(derived, "paper_neighbors", PaperNeighbors(str(tmp_path / NEIGHBORS_DIR)))
+
+    # The only paper has no neighbours
+    response = client.get("/api/papers/paper0/similar")
+    assert response.status_code == 200
+    assert response.get_json()["papers"] == []
+
+def test_similar_papers_rejects_invalid_k(client):
+    assert client.get("/api/papers/paper0/similar?k=0").status_code == 400
+    assert client.get("/api/papers/paper0/similar?k=many").status_code == 400
+    assert client.get("/api/papers/missing/similar").status_code == 404
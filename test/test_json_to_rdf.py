@@ -0,0 +1,44 @@
+import json
+from enrich.json_to_rdf import delta_paths, index_path, json_to_rdf
+
+def paper(i, topics):
+    return {"title": f"Paper {i}", "doi": f"10.1000/{i}", "publicationYear": 2020 + i,
+            "authors": [{"firstname": "Ada", "lastname": f"Author{i}"}], "openalex_topics": topics}
+
+def write_papers(path, papers):
+    with open(path, "w", encoding="utf-8") as f:
+        for p in papers:
+            f.write(json.dumps(p) + "\n")
+
+def read_graph(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return sorted(f)
+
+def test_incremental_update_matches_full_rebuild(tmp_path):
+    papers = [paper(0, ["Shared", "Only zero"]), paper(1, ["Shared", "Only one"]), paper(2, ["Shared"])]
+    # Paper 0 and its only topic go away, paper 1 moves to a new topic
+    updated = [paper(1, ["Shared", "New topic"]), paper(2, ["Shared"]), paper(3, ["Shared", "Only one"])]
+    papers_path, incremental_path, full_path = (str(tmp_path / name) for name in ("papers.jsonl", "incremental.nt", "full.nt"))
+
+    write_papers(papers_path, papers)
+    assert json_to_rdf(papers_path, incremental_path) == 0
+    previous = read_graph(incremental_path)
+    write_papers(papers_path, updated)
+    assert json_to_rdf(papers_path, incremental_path, incremental=True) == 0
+    assert json_to_rdf(papers_path, full_path) == 0
+
+    assert read_graph(incremental_path) == read_graph(full_path)
+    with open(index_path(incremental_path), encoding="utf-8") as f:
+        incremental_index = json.load(f)
+    with open(index_path(full_path), encoding="utf-8") as f:
+        full_index = json.load(f)
+    assert incremental_index == full_index
+    assert full_index["topics"] == {"New topic": 1, "Only one": 1, "Shared": 3}
+
+    # The delta retracts the declaration of the orphaned topic, and turns the previous graph into the new one
+    added_path, removed_path = delta_paths(incremental_path)
+    # Without the header line
+    added, removed = (read_graph(path)[1:] for path in (added_path, removed_path))
+    assert any(line.startswith("<http://example.org/topic/Only_zero> ") for line in removed)
+    assert not any(line.startswith("<http://example.org/topic/Only_one> ") for line in removed)
+    assert sorted(set(previous) - set(removed) | set(added)) == read_graph(full_path)
@@ -0,0 +1,12 @@
+from result_cache import normalize_query
+
+def test_normalize_query_collapses_whitespace_and_comments():
+    query = "SELECT ?s  # all subjects\n WHERE {\n\t?s ?p ?o }"
+    assert normalize_query(query) == "SELECT ?s WHERE { ?s ?p ?o }"
+
+def test_normalize_query_keeps_literals_iris_and_escapes():
+    assert normalize_query('SELECT * WHERE { ?s ?p "a  # b" }') == 'SELECT * WHERE { ?s ?p "a  # b" }'
+    assert normalize_query("SELECT * WHERE { <http://example.org/a#b> ?p ?o }") == \
+        "SELECT * WHERE { <http://example.org/a#b> ?p ?o }"
+    # An escaped # in a prefixed name does not start a comment
+    assert normalize_query("SELECT * WHERE { ?s ?p ex:a\\#b }  # comment") == "SELECT * WHERE { ?s ?p ex:a\\#b }"
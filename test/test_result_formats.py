@@ -0,0 +1,30 @@
+import json
+from flask import Flask, jsonify
+from rdflib import Literal, URIRef, Variable
+from rdflib.namespace import XSD
+from result_formats import chunked, json_term, serialize_results
+
+def test_json_results_match_jsonify():
+    variables = [Variable("paper"), Variable("title"), Variable("year")]
+    rows = [
+        (URIRef("http://example.org/resource/paper_1"), Literal("Über \"quotes\"", lang="de"),
+         Literal(2021, datatype=XSD.integer)),
+        (URIRef("http://example.org/resource/paper_2"), Literal("Line\nbreak ✓"), None),
+    ]
+    body = b"".join(chunked(serialize_results("json", variables, rows)))
+
+    # The whole result as jsonify() sends it, outside debug mode
+    expected = {
+        "head": {"vars": [str(var) for var in variables]},
+        "results": {"bindings": [{str(var): json_term(value) for var, value in zip(variables, row) if value is not None}
+                                 for row in rows]},
+    }
+    with Flask(__name__).app_context():
+        assert body == jsonify(expected).get_data()
+
+def test_truncated_json_results():
+    rows = [(Literal(i),) for i in range(3)]
+    body = b"".join(chunked(serialize_results("json", [Variable("n")], rows, max_rows=2)))
+    result = json.loads(body)
+    assert len(result["results"]["bindings"]) == 2
+    assert result["truncated"] is True
@@ -70,10 +70,12 @@ LIMIT 10
 # Consulta para ver todas las propiedades de un autor específico
 author_properties_query = """
 PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+PREFIX dcterms: <http://purl.org/dc/terms/>
 
 SELECT ?p ?o 
 WHERE {
-  <http://example.org/resource/author_0_0> ?p ?o .
+  { SELECT ?author WHERE { ?paper dcterms:creator ?author } LIMIT 1 }
+  ?author ?p ?o .
 }
 """
 
@@ -0,0 +1,27 @@
+QUERY = "SELECT ?paper ?title WHERE { ?paper <http://purl.org/dc/terms/title> ?title }"
+
+def test_only_complete_results_are_tagged(client):
+    # The streamed result may still be cut short while it is sent
+    response = client.get("/sparql", query_string={"query": QUERY})
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "MISS"
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert "ETag" not in response.headers
+    body = response.get_data()
+
+    # The complete result was cached, and is served tagged
+    response = client.get("/sparql", query_string={"query": QUERY})
+    assert response.headers["X-Cache"] == "HIT"
+    assert response.get_data() == body
+    assert response.headers["Cache-Control"].startswith("public, max-age=")
+    etag = response.headers["ETag"]
+
+    response = client.get("/sparql", query_string={"query": QUERY}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+def test_escaped_hash_in_prefixed_name(client):
+    query = ("PREFIX ex: <http://example.org/resource/>\n"
+             "SELECT ?title WHERE { ex:paper\\#1 <http://purl.org/dc/terms/title> ?title }")
+    response = client.get("/sparql", query_string={"query": query})
+    assert response.status_code == 200
+    assert response.get_json()["results"]["bindings"] == []